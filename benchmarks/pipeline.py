@@ -0,0 +1,516 @@
+"""Measure how the analysis scripts scale with the size of their inputs.
+
+For every size, the benchmark generates synthetic inputs:
+
+* six .stats files (one per compiler and oracle) with `size` rows each and
+  the exact header of data/scalac_z3.stats, whose rows are drawn (with
+  replacement) from that file,
+* six pickles in the format of pickle-bug-evolution.py with `size`
+  discovery times in total (and the same times as timeline files), and
+* an out/Programs tree with `size` bug files in total (along with the
+  files that mark the end of each run); see --max-bug-files.
+
+Every benchmark then runs in a fresh interpreter, which times each phase
+(the median of --repeat runs). The memory of each phase is measured in
+forked processes that start from the state left by the previous phases:
+one measures the peak Python heap (tracemalloc), and the other the peak
+RSS of the phase and the peak RSS of the worker processes it starts
+(e.g., the process pools of the streaming phases, whose heap tracemalloc
+does not see). The results are printed and written as JSON to --output.
+Given a previous result file, --compare reports the phases that got
+slower than --threshold and exits with a non-zero status.
+
+    python benchmarks/pipeline.py data --sizes 10000 100000 1000000
+"""
+import argparse
+from collections import defaultdict
+from datetime import datetime, timezone
+import functools
+import json
+import os
+import pickle
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                       "scripts")
+sys.path.insert(0, SCRIPTS)
+
+from script_loader import load_script  # noqa: E402
+import stats_cache  # noqa: E402
+
+performance = load_script("study-performance")
+characteristics = load_script("study-characteristics")
+evolution = load_script("bug-evolution")
+pickler = load_script("pickle-bug-evolution")
+converter = load_script("convert-pickles")
+
+COMPILERS = {
+    "scalac": ".scala",
+    "javac": ".java",
+    "ghc": ".hs",
+}
+ORACLES = ["Z3", "Construction"]
+SYMPTOMS = ["false_positive", "false_negative"]
+
+# Duration (in seconds) of the synthetic Ikaros runs.
+DURATION = 86400
+
+# Number of rows written to a synthetic .stats file at a time.
+WRITE_CHUNK = 1000000
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description=("Benchmark the analysis scripts on synthetic inputs"
+                     " of increasing size"))
+    parser.add_argument("data",
+                        help=("Directory with the original data (the rows"
+                              " of scalac_z3.stats are used as samples)"))
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10 ** 4, 10 ** 5, 10 ** 6],
+                        help=("Input sizes, up to 10^7 (rows per .stats"
+                              " file, bug times and bug files in total)"))
+    parser.add_argument("--benchmarks", nargs="+",
+                        help="Run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of timed runs per phase")
+    parser.add_argument("--max-bug-files", type=int, default=10 ** 5,
+                        help=("Maximum number of files in a synthetic bug"
+                              " tree (creating millions of files takes"
+                              " long and needs many inodes)"))
+    parser.add_argument("--work-dir",
+                        help=("Directory to store (and reuse) the synthetic"
+                              " inputs (default: a temporary directory)"))
+    parser.add_argument("--output", default="benchmark-results.json",
+                        help="File to store the results")
+    parser.add_argument("--compare",
+                        help="Results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help=("Slowdown ratio over the previous run that is"
+                              " considered a regression"))
+    # Used internally to run a single benchmark in a fresh interpreter.
+    parser.add_argument("--run", nargs=2, metavar=("BENCHMARK", "INPUTS"),
+                        help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def generate_stats(source, output_dir, size, rng):
+    """Write a .stats file per compiler and oracle with `size` rows."""
+    import pandas as pd
+
+    with open(source) as f:
+        header = f.readline()
+    # Keep the textual form of the values, so that the synthetic files are
+    # parsed exactly like the original ones.
+    rows = pd.read_csv(source, dtype=str, keep_default_na=False)
+    os.makedirs(output_dir, exist_ok=True)
+    for compiler in COMPILERS:
+        for oracle in ORACLES:
+            file_path = os.path.join(output_dir,
+                                     f"{compiler}_{oracle.lower()}.stats")
+            with open(file_path, "w") as f:
+                f.write(header)
+                for start in range(0, size, WRITE_CHUNK):
+                    n = min(WRITE_CHUNK, size - start)
+                    sample = rows.iloc[rng.integers(len(rows), size=n)]
+                    sample.to_csv(f, header=False, index=False)
+
+
+def generate_pickles(output_dir, size, rng):
+    """Write a pickle per compiler and oracle with `size` times in total."""
+    os.makedirs(output_dir, exist_ok=True)
+    keys = [(compiler, oracle) for compiler in COMPILERS
+            for oracle in ORACLES]
+    for i, (compiler, oracle) in enumerate(keys):
+        n = size // len(keys) + (i < size % len(keys))
+        data = defaultdict(list)
+        data[(compiler, oracle)] = sorted(
+            rng.uniform(0, DURATION, size=n).tolist())
+        file_path = os.path.join(output_dir,
+                                 f"{compiler}_{oracle.lower()}.pkl")
+        with open(file_path, "wb") as f:
+            pickle.dump(data, f)
+
+
+def generate_timelines(pickle_dir, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    for file in os.listdir(pickle_dir):
+        if file.endswith(".pkl"):
+            converter.convert(os.path.join(pickle_dir, file), output_dir)
+
+
+def generate_bug_tree(output_dir, size):
+    """Create an out/Programs tree with `size` bug files in total.
+
+    The end of every run is marked by a file in the times/ directory, in
+    the same way as in run-ikaros.py.
+    """
+    programs = os.path.join(output_dir, "out", "Programs")
+    dirs = [
+        (os.path.join(programs, oracle, compiler, "exhaustiveness",
+                      symptom), suffix)
+        for compiler, suffix in COMPILERS.items()
+        for oracle in ORACLES
+        for symptom in SYMPTOMS
+    ]
+    for i, (d, suffix) in enumerate(dirs):
+        os.makedirs(d, exist_ok=True)
+        n = size // len(dirs) + (i < size % len(dirs))
+        for j in range(n):
+            with open(os.path.join(d, f"Bug_{j}{suffix}"), "w") as f:
+                f.write("\n")
+    times = os.path.join(output_dir, "times")
+    os.makedirs(times, exist_ok=True)
+    for compiler in COMPILERS:
+        for oracle in ORACLES:
+            with open(os.path.join(times, f"{compiler}_{oracle.lower()}"),
+                      "w"):
+                pass
+
+
+def prepare_inputs(args, work_dir, size):
+    """Generate the inputs of the given size, unless they already exist."""
+    base = os.path.join(work_dir, str(size))
+    rng = np.random.default_rng(size)
+    generators = [
+        ("stats", lambda d: generate_stats(
+            os.path.join(args.data, "scalac_z3.stats"), d, size, rng)),
+        ("pickles", lambda d: generate_pickles(d, size, rng)),
+        ("timelines", lambda d: generate_timelines(
+            os.path.join(base, "pickles"), d)),
+        ("bugs", lambda d: generate_bug_tree(
+            d, min(size, args.max_bug_files))),
+    ]
+    for name, generate in generators:
+        d = os.path.join(base, name)
+        if os.path.exists(os.path.join(d, ".done")):
+            continue
+        shutil.rmtree(d, ignore_errors=True)
+        start = time.perf_counter()
+        generate(d)
+        with open(os.path.join(d, ".done"), "w"):
+            pass
+        print(f"Generated {name} ({size}) in"
+              f" {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return base
+
+
+# Every benchmark is a list of phases. A phase is a function that takes
+# the directory with the inputs and a dict where the phases of the same
+# benchmark share their results.
+
+def performance_phases():
+    def build_cache(inputs, state):
+        stats_cache.clear(os.path.join(inputs, "stats"))
+        performance.load_data(os.path.join(inputs, "stats"), None)
+
+    def load(inputs, state):
+        state["data"] = performance.load_data(
+            os.path.join(inputs, "stats"), None)
+
+    def compute(inputs, state):
+        state["means"] = performance.compute_means(state["data"])
+
+    def streaming(inputs, state):
+        moments = performance.load_moments(os.path.join(inputs, "stats"),
+                                           None)
+        state["means"] = performance.get_means(moments)
+
+    return [("build cache", build_cache), ("load", load),
+            ("compute", compute), ("streaming", streaming)]
+
+
+def characteristics_phases():
+    def load(inputs, state):
+        state["data"] = characteristics.load_data(
+            os.path.join(inputs, "stats"))
+
+    def compute(inputs, state):
+        rows = characteristics.get_stats_data(state["data"])
+        state["table"] = [characteristics.describe(row) for row in rows]
+
+    def histograms(inputs, state):
+        rows = characteristics.get_stats_data(state["data"])
+        state["histograms"] = [characteristics.get_histogram(row)
+                               for row in rows]
+
+    def patterns(inputs, state):
+        patterns = characteristics.get_pattern_data(state["data"])
+        state["patterns"] = characteristics.count_patterns(patterns)
+
+    def streaming(inputs, state):
+        summaries = characteristics.load_summaries(
+            os.path.join(inputs, "stats"))
+        rows = characteristics.get_sketch_data(summaries)
+        state["table"] = [characteristics.describe(row) for row in rows]
+
+    return [("load", load), ("compute", compute),
+            ("histograms", histograms), ("patterns", patterns),
+            ("streaming", streaming)]
+
+
+def evolution_phases():
+    def load(inputs, state):
+        state["data"] = evolution.load_data(os.path.join(inputs, "pickles"))
+
+    def load_timelines(inputs, state):
+        evolution.load_data(os.path.join(inputs, "timelines"))
+
+    def compute(inputs, state):
+        series = defaultdict(list)
+        for bug_dict in state["data"].values():
+            for (compiler, oracle), times in bug_dict.items():
+                series[f"{compiler} - {oracle}"].extend(times)
+        state["curves"] = evolution.cumulative_counts(series)
+
+    return [("load", load), ("load timelines", load_timelines),
+            ("compute", compute)]
+
+
+def pickle_evolution_phases():
+    def collect(inputs, output_dir=None, incremental=False):
+        # Same as the script for runs without a discovery log.
+        args = argparse.Namespace(
+            ikaros_run=os.path.join(inputs, "bugs", "out", "Programs"),
+            duration=DURATION, output_dir=output_dir,
+            incremental=incremental)
+        runs = {}
+        for compiler in COMPILERS:
+            for oracle in ORACLES:
+                end_date = pickler.extract_end_date(
+                    compiler, oracle, os.path.join(inputs, "bugs", "times"))
+                values, new = pickler.collect_ctimes(args, compiler, oracle)
+                runs[(compiler, oracle)] = end_date, values, new
+        return runs
+
+    def save_timelines(output_dir, runs):
+        for (compiler, oracle), (end_date, values, new) in runs.items():
+            pickler.save_timelines(
+                output_dir, compiler, oracle, end_date - DURATION, values,
+                new, functools.partial(pickler.compute_offsets,
+                                       end_date=end_date,
+                                       total_seconds=DURATION))
+
+    def run_incremental(inputs, state):
+        output_dir = os.path.join(state["scratch"], "incremental")
+        save_timelines(output_dir, collect(inputs, output_dir, True))
+
+    def scan(inputs, state):
+        state["runs"] = collect(inputs)
+
+    def save(inputs, state):
+        with tempfile.TemporaryDirectory() as output_dir:
+            save_timelines(output_dir, state["runs"])
+
+    def save_pickles(inputs, state):
+        with tempfile.TemporaryDirectory() as output_dir:
+            for (compiler, oracle), (end_date, values, _) in \
+                    state["runs"].items():
+                offsets = {
+                    symptom: pickler.compute_offsets(ctimes, end_date,
+                                                     DURATION)
+                    for symptom, ctimes in values.items()
+                }
+                pickler.pickle_data(
+                    compiler, oracle,
+                    pickler.get_data(compiler, oracle, offsets), output_dir)
+
+    def incremental_scan(inputs, state):
+        # The first --incremental run, which writes the index and the
+        # timelines from scratch.
+        shutil.rmtree(os.path.join(state["scratch"], "incremental"),
+                      ignore_errors=True)
+        run_incremental(inputs, state)
+
+    def rescan(inputs, state):
+        # An --incremental run when no new bug file has been found.
+        run_incremental(inputs, state)
+
+    return [("scan", scan), ("save", save), ("save pickles", save_pickles),
+            ("incremental scan", incremental_scan),
+            ("incremental rescan", rescan)]
+
+
+BENCHMARKS = {
+    "study-performance": performance_phases,
+    "study-characteristics": characteristics_phases,
+    "bug-evolution": evolution_phases,
+    "pickle-bug-evolution": pickle_evolution_phases,
+}
+
+
+def max_rss(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def measure_memory(func, inputs, state, trace):
+    """Run a phase once in a forked process and return its peak Python
+    heap (with `trace`), or its peak RSS and the peak RSS of the
+    processes it starts (in MB).
+
+    The forked process starts with the RSS of the current process at the
+    time of the fork, rather than its peak so far, and its changes to the
+    state are lost.
+    """
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        status = 1
+        try:
+            if trace:
+                tracemalloc.start()
+            func(inputs, state)
+            if trace:
+                usage = [tracemalloc.get_traced_memory()[1] / 2 ** 20]
+            else:
+                usage = [max_rss(), max_rss(resource.RUSAGE_CHILDREN)]
+            with os.fdopen(w, "w") as f:
+                json.dump(usage, f)
+            status = 0
+        finally:
+            os._exit(status)
+    os.close(w)
+    with os.fdopen(r) as f:
+        output = f.read()
+    _, status = os.waitpid(pid, 0)
+    if status != 0:
+        raise RuntimeError("phase failed in the forked process")
+    return json.loads(output)
+
+
+def run_benchmark(name, inputs, repeat):
+    """Run the phases of a benchmark (in the current process)."""
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        # Phases can keep files in state["scratch"].
+        state = {"scratch": scratch}
+        for phase, func in BENCHMARKS[name]():
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func(inputs, state)
+                times.append(time.perf_counter() - start)
+            heap, = measure_memory(func, inputs, state, trace=True)
+            rss, workers_rss = measure_memory(func, inputs, state,
+                                              trace=False)
+            results.append({
+                "phase": phase,
+                "median": statistics.median(times),
+                "min": min(times),
+                "max": max(times),
+                "peak_heap_mb": heap,
+                "max_rss_mb": rss,
+                "workers_rss_mb": workers_rss,
+            })
+    return results
+
+
+def measure(args, name, inputs):
+    """Run a benchmark in a fresh interpreter and return its results."""
+    cmd = [sys.executable, os.path.abspath(__file__), args.data,
+           "--run", name, inputs, "--repeat", str(args.repeat)]
+    proc = subprocess.run(cmd, check=True, stdout=subprocess.PIPE)
+    return json.loads(proc.stdout)
+
+
+def get_environment():
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def load_results(file_path):
+    with open(file_path) as f:
+        results = json.load(f)["results"]
+    return {(r["benchmark"], r["phase"], r["size"]): r for r in results}
+
+
+def print_results(title, results, previous):
+    header = ("Benchmark", "Phase", "Size", "Median (s)", "Heap (MB)",
+              "RSS (MB)", "Workers (MB)", "Change")
+    row_format = "{:<24}{:<20}" + "{:<14}" * (len(header) - 2)
+    lenght = 44 + 14 * (len(header) - 2)
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for r in results:
+        change = "-"
+        old = previous.get((r["benchmark"], r["phase"], r["size"]))
+        if old is not None and old["median"] > 0:
+            change = f"{r['median'] / old['median'] - 1:+.0%}"
+        row = (r["benchmark"], r["phase"], r["size"], round(r["median"], 3),
+               round(r["peak_heap_mb"], 1), round(r["max_rss_mb"], 1),
+               round(r.get("workers_rss_mb", 0), 1), change)
+        print(row_format.format(*row))
+
+
+def find_regressions(results, previous, threshold):
+    regressions = []
+    for r in results:
+        old = previous.get((r["benchmark"], r["phase"], r["size"]))
+        # Compare the fastest runs, which are the least noisy.
+        if old is not None and r["min"] > threshold * old["min"]:
+            regressions.append((r, old))
+    return regressions
+
+
+def main():
+    args = get_args()
+    if args.run is not None:
+        json.dump(run_benchmark(*args.run, args.repeat), sys.stdout)
+        return
+    names = args.benchmarks or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise SystemExit(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+    previous = load_results(args.compare) if args.compare else {}
+
+    tmp_dir = None
+    work_dir = args.work_dir
+    if work_dir is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        work_dir = tmp_dir.name
+    results = []
+    try:
+        for size in args.sizes:
+            inputs = prepare_inputs(args, work_dir, size)
+            for name in names:
+                for r in measure(args, name, inputs):
+                    results.append(dict(r, benchmark=name, size=size))
+    finally:
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    with open(args.output, "w") as f:
+        json.dump({"environment": get_environment(), "results": results}, f,
+                  indent=2)
+    print_results("Analysis pipeline", results, previous)
+
+    regressions = find_regressions(results, previous, args.threshold)
+    for r, old in regressions:
+        print(f"Regression: {r['benchmark']} ({r['phase']}, {r['size']}):"
+              f" {old['min']:.4f}s -> {r['min']:.4f}s", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Measure the startup time of the table-only paths of the analysis scripts.
+
+Every command is run several times in a fresh interpreter and the median
+wall-clock time is reported. The first row measures the import of the
+plotting stack (matplotlib, seaborn and pandas) on its own, that is, the
+cost that the table-only paths no longer pay.
+
+    python benchmarks/startup.py data
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                       "scripts")
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="Measure the startup time of the analysis scripts")
+    parser.add_argument("data",
+                        help="Directory with the .stats and .pkl files")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of runs per command")
+    return parser.parse_args()
+
+
+def get_commands(data_dir, output_dir):
+    def script(name, *args):
+        return [sys.executable, os.path.join(SCRIPTS, name)] + list(args)
+
+    return [
+        ("plotting stack import",
+         [sys.executable, "-c",
+          "import matplotlib.pyplot, seaborn, pandas"]),
+        ("study-performance",
+         script("study-performance.py", data_dir)),
+        ("bug-evolution --no-plot",
+         script("bug-evolution.py", data_dir, output_dir, "--no-plot")),
+        ("study-characteristics --no-plot",
+         script("study-characteristics.py", data_dir, output_dir,
+                "--no-plot")),
+    ]
+
+
+def measure(cmd, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    args = get_args()
+    header = ("Command", "Median (s)", "Min (s)", "Max (s)")
+    row_format = "{:<35}" + "{:<12}" * (len(header) - 1)
+    lenght = 35 + 12 * (len(header) - 1)
+    print("Startup time".center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    with tempfile.TemporaryDirectory() as output_dir:
+        for name, cmd in get_commands(args.data, output_dir):
+            times = measure(cmd, args.repeat)
+            row = (name, round(statistics.median(times), 3),
+                   round(min(times), 3), round(max(times), 3))
+            print(row_format.format(*row))
+
+
+if __name__ == "__main__":
+    main()
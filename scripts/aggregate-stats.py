@@ -0,0 +1,178 @@
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+
+from script_loader import load_script
+import sketches
+import stats_cache
+
+
+performance = load_script("study-performance")
+characteristics = load_script("study-characteristics")
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description=("Aggregate the statistics of many Ikaros campaigns"
+                     " (Table 3 and Table 2b)"))
+    parser.add_argument("root",
+                        help=("Directory that is searched (recursively) for"
+                              " the more_stats.csv files of Ikaros runs"))
+    parser.add_argument("--output",
+                        help=("Directory to store the histograms of"
+                              " Table 2b (no histograms if omitted)"))
+    parser.add_argument("--rows", type=int, default=0,
+                        help=("Number of programs to consider from each"
+                              " file (0 considers all programs)"))
+    parser.add_argument("--chunk-size", type=int, default=100000,
+                        help="Number of rows per chunk")
+    parser.add_argument("--jobs", type=int,
+                        help="Number of processes (default: number of CPUs)")
+    parser.add_argument("--smt-timeout", type=int,
+                        default=performance.SMT_TIMEOUT,
+                        help=("SMT runs that took at least this time (in μs)"
+                              " are considered as timeouts"))
+    parser.add_argument("--no-cache",
+                        default=False,
+                        action="store_true",
+                        help="Parse the stats files without using the cache")
+    return parser.parse_args()
+
+
+def discover(root):
+    """Find the more_stats.csv file of every Ikaros run under root.
+
+    Ikaros stores this file in <campaign>/Programs/<Oracle>/<compiler>/.
+    Yield one shard per file as a (campaign, compiler, oracle, path) tuple.
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames
+                             if d != stats_cache.CACHE_DIR)
+        if "more_stats.csv" not in filenames:
+            continue
+        oracle_dir, compiler = os.path.split(dirpath)
+        campaign_dir, oracle = os.path.split(oracle_dir)
+        campaign = os.path.relpath(campaign_dir, root)
+        yield (campaign, compiler, oracle.lower(),
+               os.path.join(dirpath, "more_stats.csv"))
+
+
+def reduce_shard(shard, nrows=None, chunksize=100000, use_cache=True,
+                 smt_timeout=performance.SMT_TIMEOUT):
+    """Reduce a stats file to partial sums (moments) and histograms."""
+    campaign, compiler, oracle, file_path = shard
+    perf_columns = performance.get_columns(oracle)
+    columns = perf_columns + list(characteristics.STATS_COLUMNS)
+    dtype = dict(characteristics.STATS_COLUMNS,
+                 **{c: np.int64 for c in perf_columns})
+    moments = defaultdict(sketches.RunningMoments)
+    histograms = defaultdict(sketches.IntegerHistogram)
+    chunks = stats_cache.iter_chunks(file_path, columns, nrows=nrows,
+                                     chunksize=chunksize, dtype=dtype,
+                                     use_cache=use_cache)
+    for chunk in chunks:
+        for column in perf_columns:
+            values = chunk[column]
+            moments[performance.METRICS[column]].update(values)
+            if column == "solver_time":
+                moments["SMT solving (w/ timeout)"].update(
+                    values[values < smt_timeout])
+        for column in characteristics.STATS_COLUMNS:
+            values = chunk[column]
+            if column == "num_constructor_params":
+                values = np.rint(values)
+            histograms[column].update(values)
+    return shard, dict(moments), dict(histograms)
+
+
+def aggregate(shards, nrows=None, chunksize=100000, use_cache=True,
+              jobs=None, smt_timeout=performance.SMT_TIMEOUT):
+    moments = {key: defaultdict(sketches.RunningMoments)
+               for key in performance.DATA_KEYS}
+    histograms = defaultdict(sketches.IntegerHistogram)
+    # Moments of every metric per (compiler, oracle) and campaign (a
+    # campaign can have several shards of the same run).
+    campaigns = defaultdict(
+        lambda: defaultdict(lambda: defaultdict(sketches.RunningMoments)))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(reduce_shard, shard, nrows, chunksize,
+                            use_cache, smt_timeout)
+            for shard in shards
+        ]
+        for future in futures:
+            shard, shard_moments, shard_histograms = future.result()
+            campaign, compiler, oracle, _ = shard
+            key = f"{compiler}_{oracle}"
+            for metric, m in shard_moments.items():
+                moments.setdefault(key, defaultdict(
+                    sketches.RunningMoments))[metric].merge(m)
+                campaigns[key][metric][campaign].merge(m)
+            for column, histogram in shard_histograms.items():
+                histograms[column].merge(histogram)
+    return moments, histograms, campaigns
+
+
+def print_campaign_table(title, campaigns):
+    units = {
+        "generation": "μs",
+        "compilation": "ms",
+        "SMT solving": "ms",
+    }
+
+    def convert_metric(val, unit):
+        if unit == "ms":
+            val = round(val / 1000, 1)
+        else:
+            val = round(val)
+        return str(val) + unit
+
+    header = ("Run", "Metric", "Campaigns", "Mean", "Std", "CV")
+    row_format = "{:<20}" * 2 + "{:<12}" * (len(header) - 2)
+    lenght = 40 + 12 * (len(header) - 2)
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for key in performance.DATA_KEYS:
+        for metric, unit in units.items():
+            means = [m.mean for m in campaigns[key][metric].values()
+                     if m.count]
+            if not means:
+                continue
+            mean = np.mean(means)
+            std = np.std(means, ddof=1) if len(means) > 1 else 0.0
+            cv = f"{std / mean:.1%}" if mean else "-"
+            row = (key, metric, len(means), convert_metric(mean, unit),
+                   convert_metric(std, unit), cv)
+            print(row_format.format(*row))
+
+
+def main():
+    args = get_args()
+    shards = list(discover(args.root))
+    if not shards:
+        raise SystemExit(f"No more_stats.csv found under {args.root}")
+    moments, histograms, campaigns = aggregate(
+        shards, args.rows or None, args.chunk_size, not args.no_cache,
+        args.jobs, args.smt_timeout)
+
+    means = performance.get_means(moments)
+    performance.print_performance_table("generation", means, "μs")
+    print()
+    performance.print_performance_table("compilation", means, "ms")
+    print()
+    performance.print_performance_table("SMT solving", means, "ms")
+    print()
+    characteristics.print_statistics_table(
+        "Table 2b", characteristics.get_histogram_data(histograms),
+        args.output, args.jobs, plot=args.output is not None)
+    print()
+    print_campaign_table("Per-campaign variation (Table 3)", campaigns)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Bootstrap confidence intervals and effect sizes for timing columns.
+
+Resampling the n rows of a column with replacement is the same as drawing
+the number of times every distinct value is picked from a multinomial
+distribution whose probabilities are the frequencies of the values. Each
+batch of resamples is thus a single `multinomial` call, its means a
+matrix-vector product and its medians a cumulative sum, so the cost of a
+resample depends on the number of distinct values and not on n. The
+resamples are exact: they are drawn from the distribution of the bootstrap
+over the rows.
+
+Batches of resamples are drawn in parallel, each from its own seed that
+is derived from the seed of the run, so the results only depend on the
+seed and not on the number of processes. Columns with many distinct
+values take smaller batches, so that every batch holds at most
+`MAX_DRAWS` counts.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import math
+
+import numpy as np
+
+
+BATCH_SIZE = 1000
+MAX_DRAWS = 2 ** 22
+
+
+class Sample:
+    """A column reduced to its distinct values and their counts."""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.n = len(values)
+        self.values, self.counts = np.unique(values, return_counts=True)
+
+
+def resample(values, counts, n_resamples, seed):
+    """Draw `n_resamples` resamples of a column given as distinct values
+    and counts; return the mean and the median of every resample."""
+    rng = np.random.default_rng(seed)
+    n = int(counts.sum())
+    draws = rng.multinomial(n, counts / n, size=n_resamples)
+    means = draws @ values / n
+    cumulative = np.cumsum(draws, axis=1)
+    # The median is the mean of the order statistics (n + 1) // 2 and
+    # n // 2 + 1 (1-based); the r-th one is the first value whose
+    # cumulative count reaches r.
+    low = (cumulative < (n + 1) // 2).sum(axis=1)
+    high = (cumulative < n // 2 + 1).sum(axis=1)
+    return means, (values[low] + values[high]) / 2
+
+
+def bootstrap(columns, n_resamples=10000, jobs=None, seed=0,
+              batch_size=BATCH_SIZE):
+    """Resample every column of a dict of columns.
+
+    Return a dict that maps the name of every non-empty column to a dict
+    with the means ("mean") and the medians ("median") of its resamples.
+    """
+    samples = {name: Sample(values) for name, values in columns.items()
+               if len(values)}
+    seeds = np.random.SeedSequence(seed).spawn(len(samples))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for (name, sample), seq in zip(samples.items(), seeds):
+            size = max(1, min(batch_size,
+                              MAX_DRAWS // len(sample.values)))
+            batches = [min(size, n_resamples - start)
+                       for start in range(0, n_resamples, size)]
+            futures[name] = [
+                executor.submit(resample, sample.values, sample.counts,
+                                batch, batch_seed)
+                for batch, batch_seed in zip(batches,
+                                             seq.spawn(len(batches)))
+            ]
+        results = {}
+        for name, batch_futures in futures.items():
+            means, medians = zip(*(f.result() for f in batch_futures))
+            results[name] = {
+                "mean": np.concatenate(means),
+                "median": np.concatenate(medians),
+            }
+    return results
+
+
+def percentile_interval(estimates, confidence=0.95):
+    alpha = 1 - confidence
+    low, high = np.quantile(estimates, [alpha / 2, 1 - alpha / 2])
+    return float(low), float(high)
+
+
+def cohens_d(a, b):
+    """Standardized difference between the means of b and a."""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    if len(a) < 2 or len(b) < 2:
+        return math.nan
+    pooled = ((len(a) - 1) * a.var(ddof=1) + (len(b) - 1) * b.var(ddof=1)) \
+        / (len(a) + len(b) - 2)
+    if pooled == 0:
+        return math.nan
+    return float((b.mean() - a.mean()) / math.sqrt(pooled))
+
+
+def cliffs_delta(a, b):
+    """P(x > y) - P(x < y) for x drawn from b and y drawn from a."""
+    if len(a) == 0 or len(b) == 0:
+        return math.nan
+    a = np.sort(np.asarray(a))
+    values, counts = np.unique(b, return_counts=True)
+    below = np.searchsorted(a, values, side="left")
+    above = len(a) - np.searchsorted(a, values, side="right")
+    return float(np.dot(counts, below - above) / (len(a) * len(b)))
@@ -1,45 +1,109 @@
 import argparse
+from collections import defaultdict
 import pickle
 import os
-
-import matplotlib.pyplot as plt
+import sys
+import time
 
 import numpy as np
 
-import seaborn as sns
+import bug_index
+import bug_watcher
+import build_cache
+import discovery_log
+import plotting
+import timeline_store
+
 
-plt.style.use('default')
-sns.set(style="whitegrid")
-plt.rcParams['font.monospace'] = 'Inconsolata Medium'
-plt.rcParams['font.size'] = 19
-plt.rcParams['axes.labelsize'] = 22
-plt.rcParams['axes.titlesize'] = 14
-plt.rcParams['xtick.labelsize'] = 19
-plt.rcParams['ytick.labelsize'] = 18
-plt.rcParams['legend.fontsize'] = 22
-plt.rcParams['figure.titlesize'] = 24
-plt.rcParams['figure.figsize'] = (9, 5)
-plt.rcParams['pdf.fonttype'] = 42
+SUFFIXES = {
+    "scalac": ".scala",
+    "javac": ".java",
+    "ghc": ".hs"
+}
 
 
 def get_args():
     parser = argparse.ArgumentParser(
         description='Study the evolution of bug detection')
-    parser.add_argument("data", help="Directory with pickled data.")
+    parser.add_argument("data",
+                        help=("Directory with pickled data (or the SQLite"
+                              " index of index-bugs.py)."))
     parser.add_argument("output", help="Directory to store the figure.")
     parser.add_argument("--avoid-log-scale",
                         default=False,
                         action="store_true",
                         help="Avoid using log scale in the y axis.")
+    parser.add_argument("--no-plot",
+                        default=False,
+                        action="store_true",
+                        help="Only print Table 1c; do not generate Figure 7.")
+    parser.add_argument("--live",
+                        default=False,
+                        action="store_true",
+                        help=("Treat 'data' as the out/Programs directory of"
+                              " an active Ikaros run and update the figure"
+                              " and the table as new bugs are found."))
+    parser.add_argument("--interval", type=float, default=10,
+                        help=("Minimum number of seconds between two"
+                              " updates in live mode."))
+    parser.add_argument("--poll",
+                        default=False,
+                        action="store_true",
+                        help=("Poll the bug directories instead of using"
+                              " inotify in live mode."))
+    parser.add_argument("--start-time", type=float,
+                        help=("Time (seconds since the epoch) when the"
+                              " Ikaros run started, used in live mode"
+                              " (default: the start of every run in"
+                              " --time-dir, or else the time when watching"
+                              " starts)."))
+    parser.add_argument("--time-dir",
+                        help=("Output directory of run-ikaros.py; in live"
+                              " mode, the offsets of the bug files are taken"
+                              " from its discovery log and manifest."))
+    parser.add_argument("--campaign",
+                        help=("Campaign to plot when 'data' is an index"
+                              " with several campaigns (see index-bugs.py)"))
+    parser.add_argument("--build-cache",
+                        help=("Directory of a store of figures; Figure 7 is"
+                              " copied from the store when it is"
+                              " up to date (see build_cache.py)."))
     return parser.parse_args()
 
 
-def load_data(data_dir):
+def load_index(db_path, campaign=None):
+    conn = bug_index.connect(db_path)
+    try:
+        if campaign is None:
+            campaigns = bug_index.get_campaigns(conn)
+            if len(campaigns) > 1:
+                raise ValueError(
+                    f"{db_path} holds several campaigns"
+                    f" ({', '.join(campaigns)}); choose one")
+            campaign = campaigns[0] if campaigns else ""
+        times = bug_index.load_times(conn, campaign)
+    finally:
+        conn.close()
+    return {
+        f"{compiler}_{oracle.lower()}": {(compiler, oracle): values}
+        for (compiler, oracle), values in times.items()
+    }
+
+
+def load_data(data_dir, campaign=None):
+    if os.path.isfile(data_dir):
+        return load_index(data_dir, campaign)
     oracles = ["z3", "construction"]
     compilers = ["scalac", "javac", "ghc"]
     data = {}
     for compiler in compilers:
         for oracle in oracles:
+            # Timeline files take precedence over the (older) pickles.
+            times = timeline_store.load(data_dir, compiler, oracle)
+            if times is not None:
+                key = (compiler, timeline_store.ORACLES[oracle])
+                data[f"{compiler}_{oracle}"] = {key: times}
+                continue
             file_path = os.path.join(data_dir, f"{compiler}_{oracle}.pkl")
             if not os.path.exists(file_path):
                 continue
@@ -70,7 +134,7 @@ def print_table(title, data):
             continue
         compiler, oracle = tuple(key.split("_"))
         oracle = map_oracles.get(oracle)
-        new_data[oracle][compiler] = len(list(times.values())[0])
+        new_data[oracle][compiler] = sum(len(t) for t in times.values())
 
     # res should be a dict of dict in the following format:
     # {"row name": {"column name": value, ...}, ...}
@@ -94,6 +158,39 @@ def print_table(title, data):
         print_line(header, row)
 
 
+def cumulative_counts(series):
+    """Build the cumulative bug curves of all series on a shared timeline.
+
+    `series` maps a label to the discovery times of that label. The result
+    is a tuple `(timeline, counts)`, where `timeline` is the sorted union of
+    all discovery times (duplicates included) and `counts[label]` is an
+    array holding the cumulative number of bugs of `label` at each point of
+    the timeline.
+
+    When several discoveries share a timestamp, the k-th occurrence of that
+    timestamp in the timeline accounts for at most k discoveries of each
+    series, i.e., a series steps up one bug at a time.
+    """
+    sorted_series = {key: np.sort(np.asarray(times, dtype=np.float64))
+                     for key, times in series.items()}
+    if sorted_series:
+        timeline = np.sort(np.concatenate(list(sorted_series.values())))
+    else:
+        timeline = np.empty(0, dtype=np.float64)
+
+    # Rank of each timeline point among the points with the same value.
+    rank = np.arange(1, len(timeline) + 1) - \
+        np.searchsorted(timeline, timeline, side="left")
+
+    counts = {}
+    for key, times in sorted_series.items():
+        before = np.searchsorted(times, timeline, side="left")
+        ties = np.searchsorted(times, timeline, side="right") - before
+        dtype = np.min_scalar_type(len(times))
+        counts[key] = (before + np.minimum(rank, ties)).astype(dtype)
+    return timeline, counts
+
+
 def plot_evolution_diagram(data, output_dir, log_scale):
     map_oracles = {
         "Z3": "RPG",
@@ -106,33 +203,17 @@ def plot_evolution_diagram(data, output_dir, log_scale):
             key = f"{compiler} - {map_oracles[oracle]}"
             if key not in plot_data:
                 plot_data[key] = []
-            plot_data[key].extend(times)
-
-    all_times = []
-    for times in plot_data.values():
-        all_times.extend(times)
-
-    all_times = sorted(all_times)
-
-    standardized_data = {}
-
-    for key, times in plot_data.items():
-        times = np.array(times)  # Convert to numpy array for easy processing
-        times.sort()
-        cumulative_counts = np.arange(1, len(times) + 1)
-
-        interpolated_counts = []
-        current_count = 0
-        index = 0
-
-        for t in all_times:
-            if index < len(times) and times[index] == t:
-                current_count = cumulative_counts[index]
-                index += 1
-            interpolated_counts.append(current_count)
-
-        standardized_data[key] = (all_times, interpolated_counts)
+            plot_data[key].append(np.asarray(times, dtype=np.float64))
+    plot_data = {key: np.concatenate(times)
+                 for key, times in plot_data.items()}
+
+    all_times, counts = cumulative_counts(plot_data)
+    standardized_data = {
+        key: (all_times, counts[key])
+        for key in plot_data
+    }
 
+    plt, sns = plotting.setup()
     fig, ax = plt.subplots(figsize=(10, 6))
 
     color_palette = sns.color_palette("colorblind")
@@ -153,13 +234,102 @@ def plot_evolution_diagram(data, output_dir, log_scale):
     plt.tight_layout()
     plt.savefig(f"{output_dir}/evolution.pdf", bbox_inches='tight',
                 pad_inches=0)
+    plt.close(fig)
+
+
+def watch_evolution(args):
+    """Keep the figure and Table 1c up to date while Ikaros is running.
+
+    New bug files are detected through inotify (or by polling), while the
+    outputs are regenerated at most once every `args.interval` seconds.
+    """
+    watch_start = time.time()
+    starts = {}
+    logged = {}
+    campaigns = {}
+    for compiler, suffix in SUFFIXES.items():
+        for oracle in ["Z3", "Construction"]:
+            for symptom in ["false_positive", "false_negative"]:
+                d = os.path.join(args.data, oracle, compiler,
+                                 "exhaustiveness", symptom)
+                campaigns[d] = (compiler, oracle, symptom)
+    dirs = {d: SUFFIXES[compiler]
+            for d, (compiler, _, _) in campaigns.items()}
+    watcher = bug_watcher.create_watcher(dirs, use_inotify=not args.poll,
+                                         interval=min(1.0, args.interval))
+
+    data = {}
+    dirty = False
+    last_update = float("-inf")
+    try:
+        while True:
+            wait = args.interval
+            if dirty:
+                wait = max(0, last_update + args.interval - time.monotonic())
+            events = watcher.poll(wait)
+            if events and args.time_dir and args.start_time is None:
+                # Re-read them, as runs may start (or be repeated) while
+                # watching.
+                manifest = discovery_log.read_manifest(args.time_dir) or {}
+                starts = {run: info["start"]
+                          for run, info in manifest.items()}
+                logged = {
+                    (run, symptom, name): offset
+                    for run, entries in discovery_log.read_log(
+                        args.time_dir).items()
+                    for symptom, offset, name in entries
+                }
+            for d, name, ctime in events:
+                compiler, oracle, symptom = campaigns[d]
+                key = f"{compiler}_{oracle.lower()}"
+                if args.start_time is not None:
+                    offset = ctime - args.start_time
+                elif (key, symptom, name) in logged:
+                    offset = logged[(key, symptom, name)]
+                else:
+                    offset = ctime - starts.get(key, watch_start)
+                times = data.setdefault(key, defaultdict(list))
+                times[(compiler, oracle)].append(max(0.0, offset))
+                dirty = True
+            if dirty and time.monotonic() - last_update >= args.interval:
+                if not args.no_plot:
+                    plot_evolution_diagram(
+                        data, args.output,
+                        log_scale=not args.avoid_log_scale)
+                print_table("Table 1c", data)
+                print(flush=True)
+                dirty = False
+                last_update = time.monotonic()
+    except KeyboardInterrupt:
+        if dirty:
+            if not args.no_plot:
+                plot_evolution_diagram(data, args.output,
+                                       log_scale=not args.avoid_log_scale)
+            print_table("Table 1c", data)
+    finally:
+        watcher.close()
+
+
+def render_evolution_diagram(data, output_dir, log_scale, cache):
+    cache.build("evolution.pdf", os.path.join(output_dir, "evolution.pdf"),
+                lambda: plot_evolution_diagram(data, output_dir, log_scale),
+                data={"data": data, "log_scale": log_scale},
+                sources=[__file__, plotting.__file__])
 
 
 def main():
     args = get_args()
-    data = load_data(args.data)
-    plot_evolution_diagram(data, args.output,
-                           log_scale=not args.avoid_log_scale)
+    if args.live:
+        watch_evolution(args)
+        return
+    try:
+        data = load_data(args.data, args.campaign)
+    except ValueError as e:
+        sys.exit(f"error: {e} with --campaign")
+    if not args.no_plot:
+        render_evolution_diagram(data, args.output,
+                                 not args.avoid_log_scale,
+                                 build_cache.BuildCache(args.build_cache))
     print_table("Table 1c", data)
 
 
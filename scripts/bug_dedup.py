@@ -0,0 +1,55 @@
+"""Detect bug-triggering programs that differ only in identifier names.
+
+Ikaros names the entities of the programs it generates after their kind,
+e.g., `T_A` (trait), `CC_B` (case class), `I_A` (interface), `R_A`
+(record) and `v_a` (variable). `normalize` renames these identifiers in
+the order they first appear (`T_A` -> `T_0`, `v_b` -> `v_0`, ...) and
+collapses whitespace, so that two programs get the same `program_hash`
+if and only if they are equal up to a consistent renaming.
+
+Program hashes are stored in the bug index (see bug_index.py), so every
+file is hashed only once.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import re
+
+
+# The names of the generated types and constructors (e.g., `CC_B`) and of
+# the generated variables (e.g., `v_a`). Other names with an underscore
+# are kept as they are.
+IDENTIFIER = re.compile(r"\b(?:(CC|I|R|T)_[A-Z]+|(v)_[a-z]+)\b")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(source):
+    names = {}
+    counters = {}
+
+    def rename(match):
+        name = match.group(0)
+        if name not in names:
+            prefix = match.group(1) or match.group(2)
+            n = counters.get(prefix, 0)
+            counters[prefix] = n + 1
+            names[name] = f"{prefix}_{n}"
+        return names[name]
+
+    return WHITESPACE.sub(" ", IDENTIFIER.sub(rename, source)).strip()
+
+
+def hash_program(file_path):
+    """Return the SHA-256 of a file and the hash of its normalized form."""
+    with open(file_path, "rb") as f:
+        content = f.read()
+    source = content.decode("utf-8", errors="replace")
+    return (hashlib.sha256(content).hexdigest(),
+            hashlib.sha256(normalize(source).encode()).hexdigest())
+
+
+def hash_programs(file_paths, jobs=None):
+    """Hash many files in parallel; return a list of (sha256, program_hash)."""
+    if len(file_paths) < 2 or jobs == 1:
+        return [hash_program(file_path) for file_path in file_paths]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(hash_program, file_paths, chunksize=64))
@@ -0,0 +1,186 @@
+"""SQLite index of the bug-triggering programs found by Ikaros runs.
+
+The index holds one row per bug file with its campaign (the directory of
+the Ikaros run that found it), compiler, oracle, symptom, discovery
+offset (seconds since the start of the run), size, SHA-256 hash and
+program hash (see bug_dedup.py), along with the end date and the
+duration of every run (which determine the offsets). Several campaigns
+can be indexed in the same database. See index-bugs.py for building the
+index.
+"""
+import sqlite3
+
+import numpy as np
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    campaign TEXT NOT NULL,
+    compiler TEXT NOT NULL,
+    oracle TEXT NOT NULL,
+    end_date REAL NOT NULL,
+    duration REAL NOT NULL,
+    PRIMARY KEY (campaign, compiler, oracle)
+);
+CREATE TABLE IF NOT EXISTS bugs (
+    campaign TEXT NOT NULL,
+    compiler TEXT NOT NULL,
+    oracle TEXT NOT NULL,
+    symptom TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    ctime REAL NOT NULL,
+    offset_seconds REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    program_hash TEXT NOT NULL,
+    PRIMARY KEY (campaign, compiler, oracle, symptom, name)
+);
+CREATE INDEX IF NOT EXISTS bugs_by_offset
+    ON bugs (campaign, compiler, oracle, symptom, offset_seconds);
+CREATE INDEX IF NOT EXISTS bugs_by_hash ON bugs (sha256);
+CREATE INDEX IF NOT EXISTS bugs_by_program
+    ON bugs (compiler, oracle, program_hash);
+"""
+
+COLUMNS = ["campaign", "compiler", "oracle", "symptom", "name", "path",
+           "ctime", "offset_seconds", "size", "sha256", "program_hash"]
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def get_campaigns(conn):
+    return [campaign for campaign, in conn.execute(
+        "SELECT DISTINCT campaign FROM runs ORDER BY campaign")]
+
+
+def get_run(conn, campaign, compiler, oracle):
+    """Return the (end_date, duration) of a run, or None."""
+    return conn.execute(
+        "SELECT end_date, duration FROM runs"
+        " WHERE campaign = ? AND compiler = ? AND oracle = ?",
+        (campaign, compiler, oracle)).fetchone()
+
+
+def set_run(conn, campaign, compiler, oracle, end_date, duration):
+    conn.execute(
+        "INSERT OR REPLACE INTO runs"
+        " (campaign, compiler, oracle, end_date, duration)"
+        " VALUES (?, ?, ?, ?, ?)",
+        (campaign, compiler, oracle, end_date, duration))
+
+
+def get_ctimes(conn, campaign, compiler, oracle):
+    """Return the (rowid, ctime) pairs of the bugs of a run."""
+    return conn.execute(
+        "SELECT rowid, ctime FROM bugs"
+        " WHERE campaign = ? AND compiler = ? AND oracle = ?",
+        (campaign, compiler, oracle)).fetchall()
+
+
+def set_offsets(conn, offsets):
+    """Update the offsets of bugs given as (offset, rowid) pairs."""
+    conn.executemany("UPDATE bugs SET offset_seconds = ? WHERE rowid = ?",
+                     offsets)
+
+
+def get_files(conn, campaign, compiler, oracle, symptom):
+    """Return the (size, ctime, program_hash) of every indexed bug of a
+    run with the symptom, by file name.
+
+    Ikaros reuses the names of the bug files when a run is repeated in
+    the same directory, so a bug is only up to date if the size and the
+    creation time of its file have not changed.
+    """
+    return {
+        name: (size, ctime, program_hash)
+        for name, size, ctime, program_hash in conn.execute(
+            "SELECT name, size, ctime, program_hash FROM bugs"
+            " WHERE campaign = ? AND compiler = ? AND oracle = ?"
+            " AND symptom = ?",
+            (campaign, compiler, oracle, symptom))
+    }
+
+
+def delete_bugs(conn, campaign, compiler, oracle, symptom, names):
+    conn.executemany(
+        "DELETE FROM bugs WHERE campaign = ? AND compiler = ?"
+        " AND oracle = ? AND symptom = ? AND name = ?",
+        [(campaign, compiler, oracle, symptom, name) for name in names])
+
+
+def add_bugs(conn, bugs):
+    """Insert bugs, given as dicts with a value for each of COLUMNS."""
+    placeholders = ", ".join(f":{column}" for column in COLUMNS)
+    conn.executemany(
+        f"INSERT OR REPLACE INTO bugs ({', '.join(COLUMNS)})"
+        f" VALUES ({placeholders})", bugs)
+
+
+def query(conn, compiler=None, oracle=None, symptom=None, start=None,
+          end=None, campaign=None):
+    """Return the bugs that match all the given criteria.
+
+    `start` and `end` restrict the discovery offset (in seconds) to the
+    interval [start, end). Every bug is returned as a dict.
+    """
+    conditions = []
+    params = []
+    for column, value in [("campaign", campaign), ("compiler", compiler),
+                          ("oracle", oracle), ("symptom", symptom)]:
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if start is not None:
+        conditions.append("offset_seconds >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("offset_seconds < ?")
+        params.append(end)
+    sql = f"SELECT {', '.join(COLUMNS)} FROM bugs"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY campaign, compiler, oracle, offset_seconds"
+    return [dict(zip(COLUMNS, row)) for row in conn.execute(sql, params)]
+
+
+def count_bugs(conn):
+    """Return the number of bugs per (campaign, compiler, oracle,
+    symptom).
+
+    Every count is a (raw, unique) pair, where unique is the number of
+    distinct programs (up to identifier names).
+    """
+    rows = conn.execute(
+        "SELECT campaign, compiler, oracle, symptom, COUNT(*),"
+        " COUNT(DISTINCT program_hash) FROM bugs"
+        " GROUP BY campaign, compiler, oracle, symptom")
+    return {(campaign, compiler, oracle, symptom): (raw, unique)
+            for campaign, compiler, oracle, symptom, raw, unique in rows}
+
+
+def load_times(conn, campaign):
+    """Return the discovery offsets of the bugs of every run of a
+    campaign.
+
+    The result maps every (compiler, oracle) pair to an array of offsets
+    (empty for runs that found no bugs).
+    """
+    times = {
+        (compiler, oracle): []
+        for compiler, oracle in conn.execute(
+            "SELECT compiler, oracle FROM runs WHERE campaign = ?",
+            (campaign,))
+    }
+    rows = conn.execute(
+        "SELECT compiler, oracle, offset_seconds FROM bugs"
+        " WHERE campaign = ? ORDER BY compiler, oracle, offset_seconds",
+        (campaign,))
+    for compiler, oracle, offset in rows:
+        times.setdefault((compiler, oracle), []).append(offset)
+    return {key: np.asarray(values, dtype=np.float64)
+            for key, values in times.items()}
@@ -0,0 +1,165 @@
+"""Inverted indexes over the bugs of a bugs.json file.
+
+For every field of FIELDS, the index maps each value of the field to the
+set of the bugs that have this value, stored as a bitmap (a Python int
+whose i-th bit stands for the i-th bug of the file). Characteristics are
+multi-valued, so a bug may be in several of their sets. Queries combine
+bitmaps with `&` and `|` and count bugs with `int.bit_count`, so they
+never look at the bugs themselves.
+
+The index of a file is cached under a `.bugs-cache/` directory next to
+the file, keyed by the SHA-256 hash of its content; a cached index is
+only used for the exact file it was built from, and loading it takes no
+JSON parsing.
+"""
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+
+CACHE_DIR = ".bugs-cache"
+CACHE_VERSION = 1
+
+FIELDS = ["language", "status", "symptom", "characteristics", "version"]
+
+
+def file_hash(file_path):
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def get_cache_path(file_path, digest):
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)),
+                        CACHE_DIR, f"{digest}.pickle")
+
+
+def to_bitmap(positions, n):
+    bits = np.zeros(n, dtype=bool)
+    bits[positions] = True
+    return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(),
+                          "little")
+
+
+def to_positions(bitmap, n):
+    """Return the positions of the bits of a bitmap that are set."""
+    data = np.frombuffer(bitmap.to_bytes((n + 7) // 8, "little"),
+                         dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(data, bitorder="little")[:n])
+
+
+class BugIndex:
+    def __init__(self, ids, index):
+        # The ids of the bugs in the order of the file.
+        self.ids = ids
+        self.index = index
+        self.all = (1 << len(ids)) - 1
+
+    @classmethod
+    def build(cls, bugs):
+        """Index the bugs of a parsed bugs.json file (a dict of bugs)."""
+        positions = {field: {} for field in FIELDS}
+        for i, bug in enumerate(bugs.values()):
+            for field in FIELDS:
+                values = bug.get(field)
+                if values is None:
+                    continue
+                if not isinstance(values, list):
+                    values = [values]
+                for value in set(values):
+                    positions[field].setdefault(value, []).append(i)
+        index = {
+            field: {value: to_bitmap(p, len(bugs))
+                    for value, p in postings.items()}
+            for field, postings in positions.items()
+        }
+        return cls(list(bugs.keys()), index)
+
+    def values(self, field):
+        return list(self.index[field].keys())
+
+    def select(self, field, values):
+        """Return the bugs that have any of the given values in a field."""
+        bitmap = 0
+        for value in values:
+            bitmap |= self.index[field].get(value, 0)
+        return bitmap
+
+    def where(self, filters):
+        """Return the bugs that satisfy all the filters.
+
+        `filters` maps fields to lists of values; a bug satisfies a filter
+        if it has any of its values.
+        """
+        bitmap = self.all
+        for field, values in filters.items():
+            bitmap &= self.select(field, values)
+        return bitmap
+
+    def count(self, field, value, bitmap=None):
+        if bitmap is None:
+            bitmap = self.all
+        return (self.index[field].get(value, 0) & bitmap).bit_count()
+
+    def crosstab(self, rows, columns, bitmap=None):
+        """Count the bugs of every (row value, column value) pair.
+
+        `rows` and `columns` are (field, values) pairs. Return a dict
+        that maps every row value to a dict that maps every column value
+        to a count.
+        """
+        if bitmap is None:
+            bitmap = self.all
+        row_field, row_values = rows
+        column_field, column_values = columns
+        return {
+            row: {
+                column: self.count(
+                    column_field, column,
+                    bitmap & self.index[row_field].get(row, 0))
+                for column in column_values
+            }
+            for row in row_values
+        }
+
+    def members(self, bitmap):
+        """Return the positions (in the file) of the bugs of a bitmap."""
+        return to_positions(bitmap, len(self.ids))
+
+    def column(self, field):
+        """Return the list of the values of a field for every bug."""
+        values = [[] for _ in self.ids]
+        for value, bitmap in self.index[field].items():
+            for i in self.members(bitmap):
+                values[i].append(value)
+        return values
+
+
+def load(file_path, use_cache=True):
+    """Return the index of a bugs.json file, building it if needed."""
+    if not use_cache:
+        with open(file_path) as f:
+            return BugIndex.build(json.load(f))
+
+    cache_path = get_cache_path(file_path, file_hash(file_path))
+    try:
+        with open(cache_path, "rb") as f:
+            entry = pickle.load(f)
+        if entry["version"] == CACHE_VERSION:
+            return BugIndex(entry["ids"], entry["index"])
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+        pass
+    with open(file_path) as f:
+        index = BugIndex.build(json.load(f))
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"version": CACHE_VERSION, "ids": index.ids,
+                     "index": index.index}, f)
+    os.replace(tmp_path, cache_path)
+    return index
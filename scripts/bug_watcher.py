@@ -0,0 +1,200 @@
+"""Watch the directories where Ikaros stores bug-triggering programs.
+
+Two implementations are provided with the same interface: one based on
+Linux inotify (accessed through ctypes) and one that polls the
+modification time of the watched directories. `create_watcher` picks
+inotify whenever it is available.
+"""
+import abc
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Watcher(abc.ABC):
+    """Report the files that appear in a set of directories.
+
+    `dirs` maps every watched directory to the suffix of the files of
+    interest. The directories do not need to exist when the watcher is
+    created. `poll` returns a list of `(directory, name, ctime)` tuples,
+    one for each file that was not reported before, including the files
+    that existed before the directory was first seen.
+    """
+
+    def __init__(self, dirs):
+        self.dirs = dict(dirs)
+        self.seen = {d: set() for d in self.dirs}
+
+    def scan(self, d):
+        new = []
+        try:
+            with os.scandir(d) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if not name.endswith(self.dirs[d]) or \
+                            name in self.seen[d]:
+                        continue
+                    new.append(self.stat(d, name))
+        except FileNotFoundError:
+            pass
+        return [n for n in new if n is not None]
+
+    def stat(self, d, name):
+        try:
+            ctime = os.stat(os.path.join(d, name)).st_ctime
+        except FileNotFoundError:
+            return None
+        self.seen[d].add(name)
+        return d, name, ctime
+
+    @abc.abstractmethod
+    def poll(self, timeout):
+        """Wait at most `timeout` seconds for new files and return them."""
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(Watcher):
+    """Rescan a directory only when its modification time changes."""
+
+    def __init__(self, dirs, interval=1.0):
+        super().__init__(dirs)
+        self.interval = interval
+        self.mtimes = {}
+
+    def check(self):
+        new = []
+        for d in self.dirs:
+            try:
+                mtime = os.stat(d).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if self.mtimes.get(d) == mtime:
+                continue
+            self.mtimes[d] = mtime
+            new.extend(self.scan(d))
+        return new
+
+    def poll(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            new = self.check()
+            remaining = deadline - time.monotonic()
+            if new or remaining <= 0:
+                return new
+            time.sleep(min(self.interval, remaining))
+
+
+class InotifyWatcher(Watcher):
+    """Wait for IN_CREATE/IN_MOVED_TO events of the watched directories."""
+
+    def __init__(self, dirs, retry_interval=1.0):
+        super().__init__(dirs)
+        self.libc = load_libc()
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.retry_interval = retry_interval
+        self.watches = {}
+
+    def add_watches(self):
+        # Directories are watched as soon as they are created, and are
+        # scanned right after, so that no file is missed in between.
+        new = []
+        watched = set(self.watches.values())
+        for d in self.dirs:
+            if d in watched:
+                continue
+            wd = self.libc.inotify_add_watch(
+                self.fd, os.fsencode(d),
+                IN_CREATE | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                raise OSError(err, os.strerror(err), d)
+            self.watches[wd] = d
+            new.extend(self.scan(d))
+        return new
+
+    def read_events(self):
+        new = []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return new
+        offset = 0
+        while offset < len(buf):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buf, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(buf[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost: fall back to a full rescan.
+                for d in self.watches.values():
+                    new.extend(self.scan(d))
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            d = self.watches.get(wd)
+            if d is None or not name.endswith(self.dirs[d]) or \
+                    name in self.seen[d]:
+                continue
+            event = self.stat(d, name)
+            if event is not None:
+                new.append(event)
+        return new
+
+    def poll(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            new = self.add_watches()
+            remaining = deadline - time.monotonic()
+            if new or remaining <= 0:
+                return new
+            wait = remaining
+            if len(self.watches) < len(self.dirs):
+                wait = min(wait, self.retry_interval)
+            ready, _, _ = select.select([self.fd], [], [], wait)
+            if ready:
+                new = self.read_events()
+                if new:
+                    return new
+
+    def close(self):
+        os.close(self.fd)
+
+
+def load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                       ctypes.c_uint32]
+    return libc
+
+
+def create_watcher(dirs, use_inotify=True, interval=1.0):
+    if use_inotify:
+        try:
+            return InotifyWatcher(dirs, retry_interval=interval)
+        except (OSError, AttributeError):
+            # No inotify on this platform (or no more instances left).
+            pass
+    return PollingWatcher(dirs, interval=interval)
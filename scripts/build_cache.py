@@ -0,0 +1,188 @@
+"""Content-addressed store for the figures of the analysis scripts.
+
+Every figure is identified by a key: the SHA-256 hash of everything that
+determines its content, i.e., the data it plots (as loaded from the data
+files), the options that affect it (e.g., the scale of an axis), the
+source code of the scripts that draw it, and the versions of the
+plotting libraries. When the store holds a figure for the key, the
+figure is copied from the store instead of being rendered again. The
+store is a directory with the following layout:
+
+    objects/<hash>   the figures, named after the hash of their content
+    keys/<key>       the hash of the figure of every key
+    log.jsonl        one line per requested figure: its name, its key,
+                     whether it was found in the store, and the seconds
+                     it took to render or restore it
+"""
+from importlib import metadata
+import hashlib
+import json
+import numbers
+import os
+import shutil
+import time
+
+import numpy as np
+
+
+LIBRARIES = ["matplotlib", "seaborn", "numpy"]
+LOG = "log.jsonl"
+
+
+def update_hash(h, value):
+    """Feed a value (nested dicts, lists and arrays) to a hash object."""
+    if isinstance(value, dict):
+        h.update(b"d%d" % len(value))
+        for key in sorted(value, key=repr):
+            update_hash(h, key)
+            update_hash(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, numbers.Number) for v in value):
+            update_hash(h, np.asarray(value))
+            return
+        h.update(b"l%d" % len(value))
+        for v in value:
+            update_hash(h, v)
+    elif isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        h.update(f"a{value.dtype.str}{value.shape}".encode())
+        h.update(value.data)
+    else:
+        h.update(f"v{value!r}".encode())
+
+
+def file_hash(file_path):
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def get_versions():
+    versions = {}
+    for library in LIBRARIES:
+        try:
+            versions[library] = metadata.version(library)
+        except metadata.PackageNotFoundError:
+            versions[library] = None
+    return versions
+
+
+class BuildCache:
+    """Render figures through the store in `store_dir`.
+
+    Without a store (`store_dir` is None), every figure is rendered.
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = store_dir
+        self.versions = get_versions() if store_dir is not None else None
+
+    def get_key(self, name, data, sources):
+        h = hashlib.sha256()
+        update_hash(h, name)
+        update_hash(h, data)
+        update_hash(h, self.versions)
+        for source in sources:
+            update_hash(h, file_hash(source))
+        return h.hexdigest()
+
+    def restore(self, key, path):
+        """Copy the figure of a key to `path`; return False if the store
+        has no figure for the key."""
+        try:
+            with open(os.path.join(self.store_dir, "keys", key)) as f:
+                digest = f.read().strip()
+            copy(os.path.join(self.store_dir, "objects", digest), path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, key, path):
+        digest = file_hash(path)
+        obj = os.path.join(self.store_dir, "objects", digest)
+        if not os.path.exists(obj):
+            copy(path, obj)
+        os.makedirs(os.path.join(self.store_dir, "keys"), exist_ok=True)
+        write(os.path.join(self.store_dir, "keys", key), digest)
+
+    def record(self, name, key, hit, seconds):
+        entry = {"name": name, "key": key, "hit": hit,
+                 "seconds": round(seconds, 3), "time": time.time()}
+        # Lines are short, so appends of concurrent processes do not mix.
+        with open(os.path.join(self.store_dir, LOG), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def build(self, name, path, render, data, sources):
+        """Produce the figure `path` with `render()`, unless the store
+        holds a figure with the same key.
+
+        `data` holds everything `render` depends on, apart from the code
+        in the `sources` files.
+        """
+        if self.store_dir is None:
+            render()
+            return
+        start = time.perf_counter()
+        key = self.get_key(name, data, sources)
+        hit = self.restore(key, path)
+        if not hit:
+            render()
+            self.store(key, path)
+        self.record(name, key, hit, time.perf_counter() - start)
+
+    def submit(self, executor, name, path, render, data, sources):
+        """Same as build, but render the figure in an executor.
+
+        `render` must be picklable. Return an object whose `result()`
+        waits for the figure (no process is used for the figures that
+        are in the store).
+        """
+        if self.store_dir is None:
+            return executor.submit(render)
+        start = time.perf_counter()
+        key = self.get_key(name, data, sources)
+        if self.restore(key, path):
+            self.record(name, key, True, time.perf_counter() - start)
+            return Restored()
+        return PendingBuild(self, name, path, key, start,
+                            executor.submit(render))
+
+
+class Restored:
+    def result(self):
+        return None
+
+
+class PendingBuild:
+    def __init__(self, cache, name, path, key, start, future):
+        self.cache = cache
+        self.name = name
+        self.path = path
+        self.key = key
+        self.start = start
+        self.future = future
+
+    def result(self):
+        result = self.future.result()
+        if self.cache is not None:
+            self.cache.store(self.key, self.path)
+            self.cache.record(self.name, self.key, False,
+                              time.perf_counter() - self.start)
+            self.cache = None
+        return result
+
+
+def copy(src, dst):
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    tmp_path = f"{dst}.{os.getpid()}.tmp"
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+def write(file_path, content):
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, file_path)
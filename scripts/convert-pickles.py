@@ -0,0 +1,62 @@
+import argparse
+import os
+import pickle
+
+import timeline_store
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description=("Convert the pickled data of pickle-bug-evolution.py"
+                     " into timeline files"))
+    parser.add_argument("data", help="Directory with pickled data.")
+    parser.add_argument("--output-dir",
+                        help=("Directory to store the timeline files"
+                              " (default: the data directory)"))
+    return parser.parse_args()
+
+
+def convert(file_path, output_dir):
+    """Convert a pickle into timeline files of the unknown symptom.
+
+    Return the converted files along with their number of bugs, and the
+    (compiler, oracle) pairs that were skipped because they already have
+    per-symptom timelines (i.e., the run has been processed again), which
+    hold the same bugs.
+    """
+    # Only convert pickles that you trust: loading a pickle can run
+    # arbitrary code.
+    with open(file_path, "rb") as f:
+        data = pickle.load(f)
+    converted = []
+    skipped = []
+    for (compiler, oracle), times in data.items():
+        if timeline_store.has_symptoms(output_dir, compiler, oracle):
+            skipped.append((compiler, oracle))
+            continue
+        # The pickles do not record the symptom of each bug.
+        output = timeline_store.get_path(output_dir, compiler, oracle,
+                                         timeline_store.UNKNOWN_SYMPTOM)
+        timeline_store.write(output, times)
+        converted.append((output, len(times)))
+    return converted, skipped
+
+
+def main():
+    args = get_args()
+    output_dir = args.output_dir or args.data
+    os.makedirs(output_dir, exist_ok=True)
+    for file in sorted(os.listdir(args.data)):
+        if not file.endswith(".pkl"):
+            continue
+        converted, skipped = convert(os.path.join(args.data, file),
+                                     output_dir)
+        for output, n in converted:
+            print(f"{file} -> {os.path.basename(output)} ({n} bugs)")
+        for compiler, oracle in skipped:
+            print(f"{file}: skipped {compiler}_{oracle.lower()}, which"
+                  " already has per-symptom timelines")
+
+
+if __name__ == "__main__":
+    main()
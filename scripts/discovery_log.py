@@ -0,0 +1,106 @@
+"""Start-time manifest and discovery log of the runs of run-ikaros.py.
+
+`manifest.json` records the start of every run (seconds since the epoch)
+and its duration, as well as the host where it ran. `discoveries.log`
+is an append-only, tab-separated log with one line per bug file:
+
+    <run>   <symptom>   <offset>   <file name>
+
+where `<run>` is `<compiler>_<pattern generation>` (e.g., `scalac_z3`)
+and `<offset>` is the number of seconds between the start of the run and
+the discovery of the file, measured with a monotonic clock. A line with
+the symptom `start` marks the start of a run; when a run is repeated, the
+entries logged before its latest start are discarded.
+"""
+import json
+import os
+import socket
+import time
+
+
+MANIFEST = "manifest.json"
+LOG = "discoveries.log"
+VERSION = 1
+
+# Symptom of the lines that mark the start of a run.
+START = "start"
+
+
+class Manifest:
+    def __init__(self, outdir):
+        self.file_path = os.path.join(outdir, MANIFEST)
+        # Keep the runs of earlier invocations that are not repeated.
+        runs = read_manifest(outdir) or {}
+        self.data = {
+            "version": VERSION,
+            "host": socket.gethostname(),
+            "runs": runs,
+        }
+
+    def start(self, run, duration):
+        self.data["runs"][run] = {
+            "start": time.time(),
+            "duration": duration,
+        }
+        self.save()
+
+    def finish(self, run, status, end_offset):
+        self.data["runs"][run].update(status=status, end=end_offset)
+        self.save()
+
+    def save(self):
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.file_path)
+
+
+class DiscoveryLog:
+    def __init__(self, outdir):
+        self.file = open(os.path.join(outdir, LOG), "a")
+
+    def start(self, run):
+        self.append(run, START, 0.0, "")
+
+    def append(self, run, symptom, offset, name):
+        # Every line is written with a single call and flushed at once, so
+        # that readers never see a partial line (except at the very end).
+        self.file.write(f"{run}\t{symptom}\t{offset:.6f}\t{name}\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_manifest(time_dir):
+    """Return the runs of the manifest in time_dir (None without one)."""
+    try:
+        with open(os.path.join(time_dir, MANIFEST)) as f:
+            return json.load(f)["runs"]
+    except FileNotFoundError:
+        return None
+
+
+def read_log(time_dir):
+    """Return the entries of the discovery log per run.
+
+    Every entry is a (symptom, offset, name) tuple; the entries of each
+    run are in the order they were logged. A trailing partial line (of a
+    log that is still being written) is ignored.
+    """
+    entries = {}
+    try:
+        f = open(os.path.join(time_dir, LOG))
+    except FileNotFoundError:
+        return entries
+    with f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            run, symptom, offset, name = line.rstrip("\n").split("\t", 3)
+            if symptom == START:
+                entries[run] = []
+                continue
+            entries.setdefault(run, []).append(
+                (symptom, float(offset), name))
+    return entries
@@ -0,0 +1,186 @@
+import argparse
+import os
+
+import bug_dedup
+import bug_index
+from script_loader import load_script
+
+
+pickler = load_script("pickle-bug-evolution")
+
+SUFFIXES = {
+    "scalac": ".scala",
+    "javac": ".java",
+    "ghc": ".hs"
+}
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description=("Index the bug-triggering programs of Ikaros runs in"
+                     " an SQLite database and query the index"))
+    parser.add_argument("db", help="The SQLite database")
+    parser.add_argument("--ikaros-run",
+                        help=("Path to the directory that stores the"
+                              " results of an Ikaros run (add its new bug"
+                              " files to the index)"))
+    parser.add_argument("--campaign",
+                        help=("Name of the campaign of the run added with"
+                              " --ikaros-run (default: the absolute path of"
+                              " --ikaros-run), or the campaign of the bugs"
+                              " listed with --list"))
+    parser.add_argument("--time-dir",
+                        help=("Directory that indicates the time"
+                              " when each Ikaros run terminated"))
+    parser.add_argument("--duration", type=int,
+                        help=("The duration of each Ikaros run in seconds"))
+    parser.add_argument("--jobs", type=int,
+                        help=("Number of processes that hash the new bug"
+                              " files (default: number of CPUs)"))
+    parser.add_argument("--list",
+                        default=False,
+                        action="store_true",
+                        help="List the indexed bugs that match the filters")
+    parser.add_argument("--compiler", choices=list(SUFFIXES.keys()),
+                        help="Only list the bugs of this compiler")
+    parser.add_argument("--oracle", choices=["Z3", "Construction"],
+                        help="Only list the bugs of this oracle")
+    parser.add_argument("--symptom",
+                        choices=["false_positive", "false_negative"],
+                        help="Only list the bugs with this symptom")
+    parser.add_argument("--from-hour", type=float,
+                        help="Only list the bugs found after this hour")
+    parser.add_argument("--to-hour", type=float,
+                        help="Only list the bugs found before this hour")
+    args = parser.parse_args()
+    if args.ikaros_run is not None and \
+            (args.time_dir is None or args.duration is None):
+        parser.error("--ikaros-run requires --time-dir and --duration")
+    if args.ikaros_run is not None and args.campaign is None:
+        args.campaign = os.path.abspath(args.ikaros_run)
+    return args
+
+
+def scan_bugs(conn, campaign, ikaros_run, compiler, oracle, end_date,
+              duration, jobs=None):
+    """Return the bug files of a run that are not in the index yet, along
+    with the names of the indexed files that no longer exist per symptom.
+
+    Ikaros reuses the names of the bug files when a run is repeated in the
+    same directory, so indexed files whose size or creation time has
+    changed are indexed again. Only these files and the new ones are
+    hashed (in parallel).
+    """
+    bugs = []
+    removed = {}
+    bug_dirs = pickler.get_bug_dirs(ikaros_run, compiler, oracle)
+    for symptom, d in bug_dirs.items():
+        if not os.path.exists(d):
+            continue
+        files = bug_index.get_files(conn, campaign, compiler, oracle,
+                                    symptom)
+        names = set()
+        with os.scandir(d) as entries:
+            for entry in entries:
+                name = entry.name
+                if not name.endswith(SUFFIXES[compiler]):
+                    continue
+                names.add(name)
+                stat = entry.stat()
+                indexed = files.get(name)
+                if indexed is not None and \
+                        indexed[:2] == (stat.st_size, stat.st_ctime):
+                    continue
+                bugs.append({
+                    "campaign": campaign,
+                    "compiler": compiler,
+                    "oracle": oracle,
+                    "symptom": symptom,
+                    "name": name,
+                    "path": os.path.abspath(entry.path),
+                    "ctime": stat.st_ctime,
+                    "offset_seconds": pickler.compute_offset(
+                        stat.st_ctime, end_date, duration),
+                    "size": stat.st_size,
+                })
+        removed[symptom] = files.keys() - names
+    hashes = bug_dedup.hash_programs([bug["path"] for bug in bugs], jobs)
+    for bug, (sha256, program_hash) in zip(bugs, hashes):
+        bug["sha256"] = sha256
+        bug["program_hash"] = program_hash
+    return bugs, removed
+
+
+def update_index(conn, args):
+    for compiler in SUFFIXES:
+        for oracle in ["Construction", "Z3"]:
+            end_date = pickler.extract_end_date(compiler, oracle,
+                                                args.time_dir)
+            if end_date is None:
+                continue
+            with conn:
+                if bug_index.get_run(conn, args.campaign, compiler,
+                                     oracle) != (end_date, args.duration):
+                    # The offsets of the indexed bugs are relative to the
+                    # start of the run, which has changed.
+                    bug_index.set_offsets(conn, [
+                        (pickler.compute_offset(ctime, end_date,
+                                                args.duration), rowid)
+                        for rowid, ctime in bug_index.get_ctimes(
+                            conn, args.campaign, compiler, oracle)
+                    ])
+                    bug_index.set_run(conn, args.campaign, compiler, oracle,
+                                      end_date, args.duration)
+                bugs, removed = scan_bugs(
+                    conn, args.campaign, args.ikaros_run, compiler, oracle,
+                    end_date, args.duration, args.jobs)
+                for symptom, names in removed.items():
+                    bug_index.delete_bugs(conn, args.campaign, compiler,
+                                          oracle, symptom, names)
+                bug_index.add_bugs(conn, bugs)
+
+
+def print_table(title, counts):
+    header = ("Compiler", "Oracle", "Symptom", "Raw", "Unique", "Campaign")
+    row_format = "{:<15}" * len(header)
+    lenght = 15 * len(header)
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for (campaign, compiler, oracle, symptom), (raw, unique) in \
+            sorted(counts.items()):
+        print(row_format.format(compiler, oracle, symptom, raw, unique,
+                                campaign))
+
+
+def list_bugs(conn, args):
+    def to_seconds(hour):
+        return None if hour is None else hour * 3600
+
+    bugs = bug_index.query(conn, args.compiler, args.oracle, args.symptom,
+                           to_seconds(args.from_hour),
+                           to_seconds(args.to_hour), args.campaign)
+    print("campaign\tcompiler\toracle\tsymptom\thour\tsize\tsha256\tpath")
+    for bug in bugs:
+        print("{campaign}\t{compiler}\t{oracle}\t{symptom}\t{hour:.2f}\t"
+              "{size}\t{sha256}\t{path}".format(
+                  hour=bug["offset_seconds"] / 3600, **bug))
+
+
+def main():
+    args = get_args()
+    conn = bug_index.connect(args.db)
+    try:
+        if args.ikaros_run is not None:
+            update_index(conn, args)
+        if args.list:
+            list_bugs(conn, args)
+        else:
+            print_table("Indexed bugs", bug_index.count_bugs(conn))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
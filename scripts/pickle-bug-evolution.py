@@ -2,8 +2,24 @@ import argparse
 from collections import defaultdict
 import pickle
 from datetime import datetime, timezone
+import functools
 import os
 
+import bug_dedup
+import bug_index
+import discovery_log
+import timeline_store
+
+
+SUFFIXES = {
+    "scalac": ".scala",
+    "javac": ".java",
+    "ghc": ".hs"
+}
+
+# First field of the header of the index files (see load_index).
+INDEX_HEADER = "ikaros-bug-index-1"
+
 
 def get_args():
     parser = argparse.ArgumentParser(
@@ -23,7 +39,42 @@ def get_args():
     parser.add_argument("--output-dir",
                         required=True,
                         help=("Directory to store the pickled data"))
-    return parser.parse_args()
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--incremental",
+                      default=False,
+                      action="store_true",
+                      help=("Keep an index of the bug files processed so"
+                            " far in the output directory and only"
+                            " process (and append) the new ones"))
+    mode.add_argument("--dedup",
+                      default=False,
+                      action="store_true",
+                      help=("Only count the first of the programs that are"
+                            " equal up to identifier names (their hashes"
+                            " are kept in the bug index, see --index)"))
+    parser.add_argument("--index",
+                        help=("The SQLite bug index of index-bugs.py where"
+                              " --dedup looks up and stores the program"
+                              " hashes (default: bugs.db in the output"
+                              " directory)"))
+    parser.add_argument("--campaign",
+                        help=("Name of the campaign of the run in the bug"
+                              " index (default: the absolute path of"
+                              " --ikaros-run)"))
+    parser.add_argument("--format",
+                        choices=["timeline", "pickle"],
+                        default="timeline",
+                        help=("Store the data as append-only timeline files"
+                              " (default) or as pickled lists"))
+    parser.add_argument("--jobs", type=int,
+                        help=("Number of processes that hash programs with"
+                              " --dedup (default: number of CPUs)"))
+    args = parser.parse_args()
+    if args.index is None:
+        args.index = os.path.join(args.output_dir, "bugs.db")
+    if args.campaign is None:
+        args.campaign = os.path.abspath(args.ikaros_run)
+    return args
 
 
 def extract_end_date(compiler, oracle, timedir):
@@ -34,43 +85,282 @@ def extract_end_date(compiler, oracle, timedir):
     return os.path.getmtime(file_path)
 
 
-def extract_data(args, compiler, oracle, end_date):
-    dirs = [
-        os.path.join(args.ikaros_run, oracle, compiler,
-                     "exhaustiveness", "false_positive"),
-        os.path.join(args.ikaros_run, oracle, compiler,
-                     "exhaustiveness", "false_negative"),
-    ]
-    suffixes = {
-        "scalac": ".scala",
-        "javac": ".java",
-        "ghc": ".hs"
+def get_bug_dirs(ikaros_run, compiler, oracle):
+    return {
+        symptom: os.path.join(ikaros_run, oracle, compiler,
+                              "exhaustiveness", symptom)
+        for symptom in timeline_store.SYMPTOMS
     }
-    suffix = suffixes[compiler]
-    data = defaultdict(list)
-    total_seconds = args.duration
-    for d in dirs:
+
+
+def compute_offset(ctime, end_date, total_seconds):
+    offset = datetime.now().astimezone().utcoffset()
+    tz_offset = timezone(offset)
+    mod_time = \
+        datetime.fromtimestamp(ctime).replace(tzinfo=tz_offset)
+
+    end_time = \
+        datetime.fromtimestamp(end_date).replace(tzinfo=tz_offset)
+    return total_seconds - (end_time - mod_time).total_seconds()
+
+
+def new_index():
+    # "seen" maps every bug directory to the files already processed,
+    # while "ctimes" maps every symptom to the creation time of these files
+    # in the order they were discovered.
+    return {
+        "seen": {},
+        "ctimes": {symptom: [] for symptom in timeline_store.SYMPTOMS},
+    }
+
+
+def get_index_path(compiler, oracle, output_dir):
+    return os.path.join(output_dir, f"{compiler}_{oracle.lower()}.index")
+
+
+def load_index(args, compiler, oracle):
+    """Read the index of the bug files of a run processed so far.
+
+    An index file holds a header line and one line per bug file,
+    `<symptom>\t<ctime>\t<name>`, in the order the files were found.
+    Return None if there is no index for the same Ikaros run (indexes
+    of older versions were pickled and are not read).
+    """
+    file_path = get_index_path(compiler, oracle, args.output_dir)
+    header = f"{INDEX_HEADER}\t{os.path.abspath(args.ikaros_run)}\n"
+    try:
+        with open(file_path, "rb") as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+    if not content.startswith(header.encode()):
+        return None
+    # A line that was only partially written (e.g., the writer was killed)
+    # is dropped, so that the next lines are appended after a full line.
+    end = content.rfind(b"\n") + 1
+    if end < len(content):
+        os.truncate(file_path, end)
+    index = new_index()
+    bug_dirs = get_bug_dirs(args.ikaros_run, compiler, oracle)
+    lines = content[len(header):end].decode().splitlines()
+    for line in lines:
+        symptom, ctime, name = line.split("\t", 2)
+        index["seen"].setdefault(bug_dirs[symptom], set()).add(name)
+        index["ctimes"][symptom].append(float(ctime))
+    return index
+
+
+def save_index(args, compiler, oracle, files, append):
+    """Store bug files, given as (symptom, ctime, name) triples, in the
+    index of a run.
+
+    The files are appended to the index file, or replace its content if
+    `append` is false.
+    """
+    lines = "".join(f"{symptom}\t{ctime!r}\t{name}\n"
+                    for symptom, ctime, name in files)
+    file_path = get_index_path(compiler, oracle, args.output_dir)
+    if append:
+        with open(file_path, "a") as f:
+            f.write(lines)
+        return
+    os.makedirs(args.output_dir, exist_ok=True)
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(f"{INDEX_HEADER}\t{os.path.abspath(args.ikaros_run)}\n")
+        f.write(lines)
+    os.replace(tmp_path, file_path)
+
+
+def update_index(args, compiler, oracle, index):
+    """Add the bug files that are not in the index yet.
+
+    Only the new files are stat'ed; the rest are recognized by name.
+    Return the new files as (symptom, ctime, name) triples.
+    """
+    suffix = SUFFIXES[compiler]
+    new = []
+    bug_dirs = get_bug_dirs(args.ikaros_run, compiler, oracle)
+    for symptom, d in bug_dirs.items():
         if not os.path.exists(d):
             continue
-        for f in os.listdir(d):
-            if not f.endswith(suffix):
-                continue
+        seen = index["seen"].setdefault(d, set())
+        with os.scandir(d) as entries:
+            for entry in entries:
+                if not entry.name.endswith(suffix) or entry.name in seen:
+                    continue
+                seen.add(entry.name)
+                ctime = entry.stat().st_ctime
+                index["ctimes"][symptom].append(ctime)
+                new.append((symptom, ctime, entry.name))
+    return new
 
-            path = os.path.join(d, f)
-            modtimestamp = os.path.getctime(path)
-            offset = datetime.now().astimezone().utcoffset()
-            tz_offset = timezone(offset)
-            mod_time = \
-                datetime.fromtimestamp(modtimestamp).replace(tzinfo=tz_offset)
 
-            end_time = \
-                datetime.fromtimestamp(end_date).replace(tzinfo=tz_offset)
-            diff = total_seconds - (end_time - mod_time).total_seconds()
+def compute_offsets(ctimes, end_date, total_seconds):
+    return [compute_offset(ctime, end_date, total_seconds)
+            for ctime in ctimes]
 
-            data[(compiler, oracle)].append(diff)
+
+def get_data(compiler, oracle, offsets):
+    data = defaultdict(list)
+    for values in offsets.values():
+        data[(compiler, oracle)].extend(values)
     return data
 
 
+def collect_ctimes(args, compiler, oracle):
+    """Find the bug files of a run and their creation times.
+
+    With --incremental, only the files that are not in the index are
+    stat'ed, and they are appended to the index. Return the creation
+    times per symptom, along with the number of times per symptom that
+    were not in the index (at the end of each list).
+    """
+    index = None
+    if args.incremental:
+        index = load_index(args, compiler, oracle)
+    loaded = index is not None
+    if not loaded:
+        index = new_index()
+    new_files = update_index(args, compiler, oracle, index)
+    if args.incremental:
+        save_index(args, compiler, oracle, new_files, loaded)
+    new = {symptom: 0 for symptom in timeline_store.SYMPTOMS}
+    for symptom, _, _ in new_files:
+        new[symptom] += 1
+    return index["ctimes"], new
+
+
+def collect_logged_offsets(args, compiler, oracle, start, entries):
+    """Same as collect_ctimes for a run of run-ikaros.py.
+
+    The offsets are read from the entries of the discovery log of the
+    run, so no bug file is stat'ed. The timeline files are written in
+    the order of the log, so with --incremental, the entries of a
+    symptom that are already in its timeline file (for the same start
+    of the run) are not new.
+    """
+    offsets = {symptom: [] for symptom in timeline_store.SYMPTOMS}
+    for symptom, offset, _ in entries:
+        offsets[symptom].append(offset)
+    new = {symptom: len(values) for symptom, values in offsets.items()}
+    if not args.incremental or args.format != "timeline":
+        return offsets, new
+    for symptom, values in offsets.items():
+        file_path = timeline_store.get_path(args.output_dir, compiler,
+                                            oracle, symptom)
+        try:
+            if timeline_store.read_origin(file_path) != start:
+                continue
+            n = timeline_store.count(file_path)
+        except (OSError, ValueError):
+            continue
+        if n <= len(values):
+            new[symptom] = len(values) - n
+    return offsets, new
+
+
+def first_offset(first, program_hash, symptom, offset):
+    if program_hash not in first or offset < first[program_hash][1]:
+        first[program_hash] = symptom, offset
+
+
+def dedup_offsets(args, conn, compiler, oracle, get_offset):
+    """Find the first bug file of every distinct program of a run.
+
+    The program hashes of the files are looked up in the bug index, and
+    only the files that are not indexed yet, or whose size or creation
+    time has changed (e.g., the run was repeated), are hashed (and added
+    to the index). The files that no longer exist are removed from the
+    index. `get_offset(symptom, entry)` returns the offset of a file
+    (None for files that should be ignored). Return the offsets of the
+    first files per symptom, along with the number of bug files.
+    """
+    first = {}
+    raw = 0
+    new = []
+    removed = {}
+    bug_dirs = get_bug_dirs(args.ikaros_run, compiler, oracle)
+    for symptom, d in bug_dirs.items():
+        if not os.path.exists(d):
+            continue
+        files = bug_index.get_files(conn, args.campaign, compiler, oracle,
+                                    symptom)
+        names = set()
+        with os.scandir(d) as entries:
+            for entry in entries:
+                if not entry.name.endswith(SUFFIXES[compiler]):
+                    continue
+                raw += 1
+                names.add(entry.name)
+                offset = get_offset(symptom, entry)
+                if offset is None:
+                    continue
+                stat = entry.stat()
+                indexed = files.get(entry.name)
+                if indexed is not None and \
+                        indexed[:2] == (stat.st_size, stat.st_ctime):
+                    first_offset(first, indexed[2], symptom, offset)
+                else:
+                    new.append((symptom, entry, offset))
+        removed[symptom] = files.keys() - names
+    digests = bug_dedup.hash_programs(
+        [os.path.abspath(entry.path) for _, entry, _ in new], args.jobs)
+    bugs = []
+    for (symptom, entry, offset), (sha256, program_hash) in zip(new,
+                                                                digests):
+        first_offset(first, program_hash, symptom, offset)
+        stat = entry.stat()
+        bugs.append({
+            "campaign": args.campaign,
+            "compiler": compiler,
+            "oracle": oracle,
+            "symptom": symptom,
+            "name": entry.name,
+            "path": os.path.abspath(entry.path),
+            "ctime": stat.st_ctime,
+            "offset_seconds": offset,
+            "size": stat.st_size,
+            "sha256": sha256,
+            "program_hash": program_hash,
+        })
+    with conn:
+        for symptom, names in removed.items():
+            bug_index.delete_bugs(conn, args.campaign, compiler, oracle,
+                                  symptom, names)
+        bug_index.add_bugs(conn, bugs)
+    offsets = {symptom: [] for symptom in timeline_store.SYMPTOMS}
+    for symptom, offset in first.values():
+        offsets[symptom].append(offset)
+    for values in offsets.values():
+        values.sort()
+    return offsets, raw
+
+
+def save_timelines(output_dir, compiler, oracle, origin, values, new,
+                   to_offsets=None):
+    """Store the offsets of the bug files of a run in timeline files.
+
+    `values` maps every symptom to the offsets of its bug files, or to
+    values that `to_offsets` converts into offsets (e.g., creation
+    times). The last `new[symptom]` values of every symptom are appended
+    to the existing file, as long as this file holds all the other
+    values for the same start of the run (`origin`); only these values
+    are converted. Otherwise, the file is written from scratch.
+    """
+    if to_offsets is None:
+        to_offsets = list
+    os.makedirs(output_dir, exist_ok=True)
+    for symptom, symptom_values in values.items():
+        file_path = timeline_store.get_path(output_dir, compiler, oracle,
+                                            symptom)
+        n = len(symptom_values) - new[symptom]
+        if timeline_store.matches(file_path, origin, n):
+            timeline_store.append(file_path, to_offsets(symptom_values[n:]))
+            continue
+        timeline_store.write(file_path, to_offsets(symptom_values), origin)
+
+
 def pickle_data(compiler, oracle, data, output_dir):
     os.makedirs(output_dir, exist_ok=True)
     file_path = os.path.join(output_dir, f"{compiler}_{oracle.lower()}.pkl")
@@ -78,17 +368,84 @@ def pickle_data(compiler, oracle, data, output_dir):
         pickle.dump(data, file)
 
 
+def print_table(title, counts):
+    header = ("Compiler", "Oracle", "Raw", "Unique")
+    row_format = "{:<15}" * len(header)
+    lenght = 15 * len(header)
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for (compiler, oracle), (raw, unique) in counts.items():
+        print(row_format.format(compiler, oracle, raw, unique))
+
+
 def main():
     args = get_args()
     compilers = ["javac", "scalac", "ghc"]
     oracles = ["Construction", "Z3"]
+    # Runs of run-ikaros.py log when each bug file was found; the ctime
+    # of the bug files is only used for older runs.
+    manifest = discovery_log.read_manifest(args.time_dir) or {}
+    log = discovery_log.read_log(args.time_dir) if manifest else {}
+    conn = None
+    if args.dedup:
+        os.makedirs(os.path.dirname(os.path.abspath(args.index)),
+                    exist_ok=True)
+        conn = bug_index.connect(args.index)
+    counts = {}
     for compiler in compilers:
         for oracle in oracles:
-            end_date = extract_end_date(compiler, oracle, args.time_dir)
-            if end_date is None:
-                continue
-            data = extract_data(args, compiler, oracle, end_date)
-            pickle_data(compiler, oracle, data, args.output_dir)
+            run = f"{compiler}_{oracle.lower()}"
+            if run in manifest:
+                origin = manifest[run]["start"]
+                entries = log.get(run, [])
+                if args.dedup:
+                    logged = {(symptom, name): offset
+                              for symptom, offset, name in entries}
+                    values, raw = dedup_offsets(
+                        args, conn, compiler, oracle,
+                        lambda symptom, entry:
+                            logged.get((symptom, entry.name)))
+                else:
+                    values, new = collect_logged_offsets(
+                        args, compiler, oracle, origin, entries)
+                to_offsets = None
+            else:
+                end_date = extract_end_date(compiler, oracle, args.time_dir)
+                if end_date is None:
+                    continue
+                origin = end_date - args.duration
+                if args.dedup:
+                    values, raw = dedup_offsets(
+                        args, conn, compiler, oracle,
+                        lambda symptom, entry: compute_offset(
+                            entry.stat().st_ctime, end_date, args.duration))
+                    to_offsets = None
+                else:
+                    values, new = collect_ctimes(args, compiler, oracle)
+                    # Only the offsets that are stored are computed.
+                    to_offsets = functools.partial(
+                        compute_offsets, end_date=end_date,
+                        total_seconds=args.duration)
+            if args.dedup:
+                # Rewrite the data from scratch.
+                new = {symptom: len(offsets)
+                       for symptom, offsets in values.items()}
+                counts[(compiler, oracle)] = raw, sum(new.values())
+            if args.format == "timeline":
+                save_timelines(args.output_dir, compiler, oracle, origin,
+                               values, new, to_offsets)
+            else:
+                if to_offsets is not None:
+                    values = {symptom: to_offsets(ctimes)
+                              for symptom, ctimes in values.items()}
+                pickle_data(compiler, oracle,
+                            get_data(compiler, oracle, values),
+                            args.output_dir)
+    if conn is not None:
+        conn.close()
+        print_table("Bug-triggering programs", counts)
 
 
 if __name__ == "__main__":
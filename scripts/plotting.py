@@ -0,0 +1,36 @@
+"""Lazy access to the plotting stack shared by the analysis scripts.
+
+Importing matplotlib and seaborn takes a considerable amount of time, so
+the scripts only call `setup` on the code paths that draw figures.
+"""
+
+_modules = None
+
+
+def setup():
+    """Import matplotlib/seaborn, apply the style of our figures and return
+    the `(pyplot, seaborn)` modules."""
+    global _modules
+    if _modules is not None:
+        return _modules
+
+    import matplotlib
+    # All figures are saved to files; never pick an interactive backend.
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.style.use('default')
+    sns.set(style="whitegrid")
+    plt.rcParams['font.monospace'] = 'Inconsolata Medium'
+    plt.rcParams['font.size'] = 19
+    plt.rcParams['axes.labelsize'] = 22
+    plt.rcParams['axes.titlesize'] = 14
+    plt.rcParams['xtick.labelsize'] = 19
+    plt.rcParams['ytick.labelsize'] = 18
+    plt.rcParams['legend.fontsize'] = 22
+    plt.rcParams['figure.titlesize'] = 24
+    plt.rcParams['figure.figsize'] = (9, 5)
+    plt.rcParams['pdf.fonttype'] = 42
+    _modules = plt, sns
+    return _modules
@@ -1,6 +1,6 @@
 import argparse
-import json
-from collections import defaultdict
+
+import bug_query
 
 
 lang_lookup = {
@@ -29,35 +29,42 @@ def get_args():
     parser = argparse.ArgumentParser(
         description='Process bugs.json to answer RQs')
     parser.add_argument("input", help="JSON File with bugs.")
-    parser.add_argument("rq", choices=['rq1', 'rq2'], help="Select RQ.")
-    return parser.parse_args()
-
-
-def process(bug, res, chars, categories):
-    lang = bug['language']
-    status = bug['status']
-    symptom = bug['symptom']
-    lang = lang_lookup.get(lang)
-    status = status_lookup.get(status)
-    symptom = symptom_lookup.get(symptom)
-    res[lang]['status'][status] += 1
-    res[lang]['symptom'][symptom] += 1
-    res['total']['status'][status] += 1
-    res['total']['symptom'][symptom] += 1
-
-    bcategories = set()
-    for char in bug['characteristics']:
-        bcategories.add(char)
-        chars[char] += 1
-    for c in bcategories:
-        categories[c] += 1
-
-
-def print_table(title, column_name, res, extra_line=True, first_col=20):
+    parser.add_argument("rq", choices=['rq1', 'rq2', 'query'],
+                        help=("Select RQ (or 'query' to count the bugs"
+                              " of a custom table)."))
+    parser.add_argument("--rows", choices=bug_query.FIELDS,
+                        default="status",
+                        help="Field whose values are the rows of the query")
+    parser.add_argument("--columns", choices=bug_query.FIELDS,
+                        default="language",
+                        help=("Field whose values are the columns of the"
+                              " query"))
+    parser.add_argument("--where", action="append", default=[],
+                        metavar="FIELD=VALUE",
+                        help=("Only count the bugs with this value (can be"
+                              " repeated; values of the same field are"
+                              " alternatives)"))
+    parser.add_argument("--no-cache",
+                        default=False,
+                        action="store_true",
+                        help="Parse the JSON file without using the cache")
+    args = parser.parse_args()
+    filters = {}
+    for condition in args.where:
+        field, sep, value = condition.partition("=")
+        if not sep or field not in bug_query.FIELDS:
+            parser.error(f"invalid condition: {condition}")
+        filters.setdefault(field, []).append(value)
+    args.where = filters
+    return args
+
+
+def print_table(title, column_name, res, extra_line=True, first_col=20,
+                width=10):
     # res should be a dict of dict in the following format:
     # {"row name": {"column name": value, ...}, ...}
     def print_line(title, columns, values):
-        row_format = f"{{:<{first_col}}}" + "{:<10}" * len(columns)
+        row_format = f"{{:<{first_col}}}" + f"{{:<{width}}}" * len(columns)
         print(row_format.format(
             title,
             *(values[column] for column in columns)
@@ -66,8 +73,8 @@ def print_table(title, column_name, res, extra_line=True, first_col=20):
         return
 
     header = [column_name] + list(list(res.values())[0].keys())
-    row_format = f"{{:<{first_col}}}" + "{:<10}" * (len(header) - 1)
-    lenght = first_col + 10 * (len(header) - 1)
+    row_format = f"{{:<{first_col}}}" + f"{{:<{width}}}" * (len(header) - 1)
+    lenght = first_col + width * (len(header) - 1)
     print(title.center(lenght))
     print(lenght * "=")
     pretty_header = [lang_lookup.get(h, h) for h in header]
@@ -117,62 +124,91 @@ def print_chars(title, column_name, res, extra_line=True, first_col=20):
         print_line("", header, row)
 
 
+def per_attribute(index, field, lookup, names, total=True):
+    langs = ['scala', 'java', 'haskell']
+    values = {name: value for value, name in lookup.items()}
+    res = {}
+    for name in names:
+        bugs = index.select(field, [values[name]])
+        res[name] = {lang_lookup[lang]: index.count('language', lang, bugs)
+                     for lang in langs}
+        res[name]['total'] = bugs.bit_count()
+    if total:
+        res['Total'] = {lang: sum(counts[lang] for counts in res.values())
+                        for lang in res[names[0]]}
+    return res
+
+
+def get_bugs(index):
+    languages = index.column('language')
+    characteristics = index.column('characteristics')
+    return {
+        bug_id: {
+            'language': languages[i][0],
+            'characteristics': characteristics[i],
+        }
+        for i, bug_id in enumerate(index.ids)
+    }
+
+
+def print_query(index, rows, columns, filters):
+    lookup = {**lang_lookup, **status_lookup, **symptom_lookup}
+    bugs = index.where(filters)
+    row_values = sorted(index.values(rows), key=str)
+    column_values = sorted(index.values(columns), key=str)
+    counts = index.crosstab((rows, row_values), (columns, column_values),
+                            bugs)
+    counts['Total'] = {
+        column: index.count(columns, column, bugs)
+        for column in column_values
+    }
+    res = {}
+    for row, values in counts.items():
+        # Characteristics are multi-valued, so the totals are not the sums
+        # of the rows.
+        row_bugs = bugs if row == 'Total' else \
+            bugs & index.select(rows, [row])
+        res[lookup.get(row, row)] = dict(
+            {lookup.get(column, column): count
+             for column, count in values.items()},
+            total=row_bugs.bit_count())
+    first_col = max([20] + [len(str(row)) + 2 for row in res])
+    width = max([10] + [len(str(column)) + 2 for column in res['Total']])
+    print_table(f'Bugs per {rows} and {columns}', rows.capitalize(), res,
+                first_col=first_col, width=width)
+
+
+def print_rq1(index):
+    status = per_attribute(index, 'status', status_lookup,
+                           ['Unconfirmed', 'Confirmed', 'Fixed',
+                            'Wont fix'], total=True)
+    print_table('Table 1a', 'Status', status)
+
+
+def print_rq2(index):
+    symptoms = per_attribute(index, 'symptom', symptom_lookup,
+                             ['Exhaustiveness FP', 'Exhaustiveness FN',
+                              'Redundancy FP', 'Performance'],
+                             total=False)
+    print_table('Table 1b', 'Symptoms', symptoms, extra_line=False)
+
+    print()
+    print_chars('Table 2a', 'Characteristics', get_bugs(index),
+                extra_line=False)
+
+
 def main():
     args = get_args()
-    with open(args.input, 'r') as f:
-        data = json.load(f)
-    chars = defaultdict(lambda: 0)
-    res = defaultdict(lambda: {
-        'status': {
-            'Unconfirmed': 0,
-            'Confirmed': 0,
-            'Fixed': 0,
-            'Wont fix': 0,
-        },
-        'symptom': {
-            'Exhaustiveness FP': 0,
-            'Exhaustiveness FN': 0,
-            'Redundancy FP': 0,
-            'Performance': 0
-        },
-        "chars": {
-            "ADT": 0,
-            "GADT": 0,
-            "Poly. ADT": 0,
-            "constant": 0,
-            "null": 0
-        }
-    })
-    categories = defaultdict(lambda: 0)
-    for bug in data.values():
-        process(bug, res, chars, categories)
-
-    langs = ['scalac', 'javac', 'ghc', 'total']
-
-    def per_attribute(attrs, attr, total=True):
-        r = {
-            s: {lang: res[lang][attr][s]
-                for lang in langs}
-            for s in attrs
-        }
-        if total:
-            r['Total'] = {lang: sum(res[lang][attr][s] for s in r)
-                          for lang in langs}
-        return r
+    index = bug_query.load(args.input, use_cache=not args.no_cache)
 
     if args.rq == 'rq1':
-        status_cat = res['total']['status'].keys()
-        status = per_attribute(status_cat, 'status', total=True)
-        print_table('Table 1a', 'Status', status)
+        print_rq1(index)
 
     if args.rq == 'rq2':
-        symtoms_cat = res['total']['symptom'].keys()
-        symptoms = per_attribute(symtoms_cat, 'symptom', total=False)
-        print_table('Table 1b', 'Symptoms', symptoms, extra_line=False)
+        print_rq2(index)
 
-        print()
-        print_chars('Table 2a', 'Characteristics', data,
-                    extra_line=False)
+    if args.rq == 'query':
+        print_query(index, args.rows, args.columns, args.where)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+"""Reproduce all the tables and figures of the paper in a single run.
+
+Every input (bugs.json, the bug pickles or timelines, and the .stats
+files) is loaded once in the main process. The tables and the figures
+are then generated by worker processes forked from the main process, so
+they share the loaded data without parsing it again, and the plotting
+stack is imported at most once per worker. The output of every
+generator is captured and printed in the order below, so the report is
+identical to the output of the following commands (run one after the
+other):
+
+    process_bugs.py <data>/bugs.json rq1
+    process_bugs.py <data>/bugs.json rq2
+    bug-evolution.py <data> <output>
+    study-characteristics.py <data> <output>
+    study-characteristics.py <data> <output> --patterns
+    study-performance.py <data>
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import multiprocessing
+import os
+
+import bug_query
+import build_cache
+from script_loader import load_script
+
+
+process_bugs = load_script("process_bugs")
+evolution = load_script("bug-evolution")
+characteristics = load_script("study-characteristics")
+performance = load_script("study-performance")
+
+# The data shared by the generators (see load_state).
+state = {}
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description=("Reproduce all tables and figures, loading every input"
+                     " only once"))
+    parser.add_argument("data",
+                        help=("Directory with bugs.json, the pickled bug"
+                              " data and the .stats files"))
+    parser.add_argument("output", help="Directory to store the figures.")
+    parser.add_argument("--bugs",
+                        help="JSON file with bugs (default: <data>/bugs.json)")
+    parser.add_argument("--stats",
+                        help=("Directory with the .stats files"
+                              " (default: <data>)"))
+    parser.add_argument("--avoid-log-scale",
+                        default=False,
+                        action="store_true",
+                        help="Avoid using log scale in Figure 7.")
+    parser.add_argument("--no-plot",
+                        default=False,
+                        action="store_true",
+                        help="Only print the tables; do not generate figures.")
+    parser.add_argument("--no-cache",
+                        default=False,
+                        action="store_true",
+                        help="Parse the input files without using the caches")
+    parser.add_argument("--build-cache",
+                        help=("Directory of a store of figures; figures are"
+                              " copied from the store when they are"
+                              " up to date (see build_cache.py)."))
+    parser.add_argument("--jobs", type=int,
+                        help=("Number of processes that generate the tables"
+                              " and figures (default: number of CPUs)"))
+    return parser.parse_args()
+
+
+def load_state(args):
+    use_cache = not args.no_cache
+    stats_dir = args.stats or args.data
+    state["args"] = args
+    state["bugs"] = bug_query.load(
+        args.bugs or os.path.join(args.data, "bugs.json"),
+        use_cache=use_cache)
+    state["evolution"] = evolution.load_data(args.data)
+    state["characteristics"] = characteristics.load_data(
+        stats_dir, use_cache=use_cache)
+    state["performance"] = performance.load_data(stats_dir,
+                                                 use_cache=use_cache)
+
+
+def rq1():
+    process_bugs.print_rq1(state["bugs"])
+
+
+def rq2():
+    process_bugs.print_rq2(state["bugs"])
+
+
+def bug_evolution():
+    args = state["args"]
+    if not args.no_plot:
+        evolution.render_evolution_diagram(
+            state["evolution"], args.output, not args.avoid_log_scale,
+            build_cache.BuildCache(args.build_cache))
+    evolution.print_table("Table 1c", state["evolution"])
+
+
+def table_2b():
+    args = state["args"]
+    stats = characteristics.get_stats_data(state["characteristics"])
+    characteristics.print_statistics_table(
+        "Table 2b", stats, args.output, args.jobs, plot=not args.no_plot,
+        cache=build_cache.BuildCache(args.build_cache))
+
+
+def patterns():
+    args = state["args"]
+    patterns = characteristics.get_pattern_data(state["characteristics"])
+    if args.no_plot:
+        characteristics.print_pattern_table("Figure 8", patterns)
+    else:
+        characteristics.plot_pattern_diagram(
+            patterns, args.output,
+            cache=build_cache.BuildCache(args.build_cache))
+
+
+def table_3():
+    performance.print_tables(
+        performance.compute_means(state["performance"]))
+
+
+GENERATORS = [rq1, rq2, bug_evolution, table_2b, patterns, table_3]
+
+
+def generate(i):
+    """Run a generator and return everything it printed."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        GENERATORS[i]()
+    return out.getvalue()
+
+
+def main():
+    args = get_args()
+    os.makedirs(args.output, exist_ok=True)
+    load_state(args)
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=args.jobs,
+                                 mp_context=context) as executor:
+            outputs = executor.map(generate, range(len(GENERATORS)))
+            for output in outputs:
+                print(output, end="", flush=True)
+    else:
+        # Without fork, the workers would have to load the data again.
+        for i in range(len(GENERATORS)):
+            print(generate(i), end="", flush=True)
+
+
+if __name__ == "__main__":
+    main()
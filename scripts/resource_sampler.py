@@ -0,0 +1,193 @@
+"""Sample the CPU and memory usage of the process tree of Ikaros runs.
+
+Every run of run-ikaros.py is the leader of its own session, so all the
+processes it spawns (compilers, Z3) share its session id. The sampler
+reads /proc at a fixed interval and records, for every run, the CPU
+usage of the session since the previous sample (in percent of one CPU),
+including the processes that ran and exited in between (through the
+CPU time of the terminated children that every process accumulates),
+its total resident set size, the number of its processes, the number of
+JVM (scalac, javac), Z3 and GHC processes alive, and the number of such
+processes seen since the start of the run. Processes that live shorter
+than the sampling interval may be missed, so the latter is a lower
+bound on the number of compiler and solver invocations.
+
+The samples of each run are stored in `<run>.resources`, which consists
+of a 24-byte header followed by fixed-size records (see DTYPE):
+
+    magic (4 bytes, b"IKRS") | version (uint16) | record size (uint16) |
+    origin (float64, the start of the run in seconds since the epoch) |
+    interval (float64, the sampling interval in seconds)
+"""
+import os
+import struct
+
+import numpy as np
+
+
+MAGIC = b"IKRS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHdd")
+SUFFIX = ".resources"
+
+# Command names (as found in /proc/<pid>/stat) of the processes counted
+# separately.
+KINDS = {
+    "jvm": "java",
+    "z3": "z3",
+    "ghc": "ghc",
+}
+
+DTYPE = np.dtype(
+    [("offset", "<f8"), ("cpu", "<f4"), ("rss", "<f4"),
+     ("processes", "<u4")] +
+    [(kind, "<u4") for kind in KINDS] +
+    [(f"{kind}_spawned", "<u4") for kind in KINDS]
+)
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def get_path(outdir, run):
+    return os.path.join(outdir, run + SUFFIX)
+
+
+def available():
+    return os.path.exists("/proc/self/stat")
+
+
+def get_kind(comm):
+    for kind, name in KINDS.items():
+        # GHC executables are often versioned, e.g., ghc-9.4.7.
+        if comm == name or comm.startswith(name + "-"):
+            return kind
+    return None
+
+
+def read_processes():
+    """Yield the (pid, comm, session, start, cpu ticks, rss pages) of
+    every process.
+
+    The CPU ticks include those of the terminated children that the
+    process has waited for.
+    """
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            # The process has terminated.
+            continue
+        # The command name is enclosed in parentheses and may contain
+        # spaces.
+        comm = stat[stat.index("(") + 1:stat.rindex(")")]
+        fields = stat[stat.rindex(")") + 2:].split()
+        # utime, stime, cutime, and cstime.
+        cpu = sum(int(v) for v in fields[11:15])
+        yield (int(entry), comm, int(fields[3]), int(fields[19]), cpu,
+               int(fields[21]))
+
+
+class Sampler:
+    def __init__(self):
+        # Session and CPU ticks of every (pid, start time) at the previous
+        # sample.
+        self.ticks = {}
+        # Processes of every kind seen in every session.
+        self.seen = {}
+        # Time of the previous sample of every session.
+        self.last = {}
+
+    def sample(self, sessions, now):
+        """Sample the given sessions, which map every session id to the
+        time (on the monotonic clock) the session started.
+
+        Return a dict that maps every session with at least one process
+        to a record (without its offset).
+        """
+        usage = {}
+        ticks = {}
+        for pid, comm, session, start, cpu, rss in read_processes():
+            if session not in sessions:
+                continue
+            key = pid, start
+            ticks[key] = session, cpu
+            u = usage.setdefault(session, {
+                "ticks": 0, "rss": 0, "processes": 0,
+                "kinds": dict.fromkeys(KINDS, 0),
+            })
+            u["ticks"] += cpu - self.ticks.get(key, (session, 0))[1]
+            u["rss"] += rss
+            u["processes"] += 1
+            kind = get_kind(comm)
+            if kind is not None:
+                u["kinds"][kind] += 1
+                self.seen.setdefault(session, {k: set() for k in KINDS})
+                self.seen[session][kind].add(key)
+        # When a process terminates, all its ticks move to its parent's
+        # children ticks, including those already counted by the previous
+        # samples; take them out again.
+        for key, (session, cpu) in self.ticks.items():
+            if key not in ticks and session in usage:
+                usage[session]["ticks"] -= cpu
+        self.ticks = ticks
+        records = {}
+        for session, u in usage.items():
+            elapsed = now - self.last.get(session, sessions[session])
+            self.last[session] = now
+            cpu = 0.0
+            if elapsed > 0:
+                # A process that was reaped outside the session (e.g.,
+                # by init) may make the ticks negative.
+                cpu = 100 * max(0, u["ticks"]) / CLOCK_TICKS / elapsed
+            seen = self.seen.get(session, {k: () for k in KINDS})
+            records[session] = (
+                (cpu, u["rss"] * PAGE_SIZE / 2 ** 20, u["processes"]) +
+                tuple(u["kinds"][kind] for kind in KINDS) +
+                tuple(len(seen[kind]) for kind in KINDS)
+            )
+        return records
+
+
+class Writer:
+    """Write the samples of a run to a new file."""
+
+    def __init__(self, file_path, origin, interval):
+        self.file = open(file_path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, DTYPE.itemsize, origin,
+                                    interval))
+        self.file.flush()
+
+    def append(self, offset, record):
+        self.file.write(np.array([(offset,) + record], dtype=DTYPE)
+                        .tobytes())
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_header(file_path):
+    """Return the (origin, interval) of a resource file."""
+    with open(file_path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{file_path}: truncated header")
+    magic, version, itemsize, origin, interval = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or itemsize != DTYPE.itemsize:
+        raise ValueError(f"{file_path}: not a resource file")
+    return origin, interval
+
+
+def read(file_path):
+    """Return the samples of a resource file as a structured array."""
+    read_header(file_path)
+    # A record that was only partially written is ignored.
+    n = (os.path.getsize(file_path) - HEADER.size) // DTYPE.itemsize
+    if n == 0:
+        return np.empty(0, dtype=DTYPE)
+    return np.memmap(file_path, dtype=DTYPE, mode="r", offset=HEADER.size,
+                     shape=(n,))
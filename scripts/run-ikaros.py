@@ -0,0 +1,371 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+
+import bug_watcher
+import discovery_log
+import resource_sampler
+
+
+LANGUAGES = {
+    "scala": "scalac",
+    "java": "javac",
+    "haskell": "ghc",
+}
+
+ORACLES = {
+    "construction": "Construction",
+    "z3": "Z3",
+}
+
+SUFFIXES = {
+    "scalac": ".scala",
+    "javac": ".java",
+    "ghc": ".hs",
+}
+
+SYMPTOMS = ["false_positive", "false_negative"]
+
+# Seconds to wait after SIGTERM before killing a run with SIGKILL.
+KILL_GRACE = 10
+
+# Maximum delay (in seconds) between the creation of a bug directory and
+# the moment the orchestrator starts watching it.
+WATCH_INTERVAL = 0.2
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description=("Run Ikaros for every (language, pattern generation)"
+                     " pair concurrently"))
+    parser.add_argument("timeout", type=int,
+                        help="Duration of each Ikaros run in seconds")
+    parser.add_argument("outdir",
+                        help=("Directory to store the files that indicate"
+                              " the time when each Ikaros run terminated"))
+    parser.add_argument("--languages", nargs="+",
+                        choices=list(LANGUAGES.keys()),
+                        default=list(LANGUAGES.keys()),
+                        help="Target languages")
+    parser.add_argument("--pattern-gens", nargs="+",
+                        choices=list(ORACLES.keys()),
+                        default=list(ORACLES.keys()),
+                        help="Pattern generation strategies")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="Maximum number of concurrent Ikaros runs")
+    parser.add_argument("--run-dir", default="runs",
+                        help=("Directory that holds the working directory"
+                              " (and the out/ directory) of each run"))
+    parser.add_argument("--out", default="out",
+                        help=("Directory that exposes the results of all"
+                              " runs under a single out/Programs tree"))
+    parser.add_argument("--ikaros", default="ikaros",
+                        help="The Ikaros executable")
+    parser.add_argument("--iterations", type=int,
+                        help="Number of programs to generate per run")
+    parser.add_argument("--sample-interval", type=float, default=1.0,
+                        help=("Seconds between two samples of the CPU and"
+                              " memory usage of every run (0 disables"
+                              " sampling)"))
+    return parser.parse_args()
+
+
+class Run:
+    def __init__(self, language, pattern_gen, run_dir):
+        self.language = language
+        self.pattern_gen = pattern_gen
+        self.compiler = LANGUAGES[language]
+        self.oracle = ORACLES[pattern_gen]
+        self.name = f"{self.compiler}_{pattern_gen}"
+        self.cwd = os.path.abspath(os.path.join(run_dir, self.name))
+        self.pid = None
+        # Value of the monotonic clock when the run started.
+        self.start = None
+        self.timed_out = False
+        self.status = "pending"
+        self.returncode = None
+        self.wall_time = 0.0
+        self.user_time = 0.0
+        self.system_time = 0.0
+        self.max_rss = 0
+
+    @property
+    def programs_dir(self):
+        return os.path.join(self.cwd, "out", "Programs", self.oracle,
+                            self.compiler)
+
+    def bug_dirs(self):
+        return {
+            symptom: os.path.join(self.programs_dir, "exhaustiveness",
+                                  symptom)
+            for symptom in SYMPTOMS
+        }
+
+
+class Orchestrator:
+    def __init__(self, args):
+        self.args = args
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+        self.manifest = None
+        self.log = None
+        self.runs = [
+            Run(language, pattern_gen, args.run_dir)
+            for language in args.languages
+            for pattern_gen in args.pattern_gens
+        ]
+
+    def prepare(self):
+        os.makedirs(self.args.outdir, exist_ok=True)
+        for run in self.runs:
+            marker = os.path.join(self.args.outdir, run.name)
+            if os.path.exists(marker):
+                os.remove(marker)
+            shutil.rmtree(run.cwd, ignore_errors=True)
+            os.makedirs(run.programs_dir)
+
+            # Link every run into a shared out/Programs/<Oracle>/<compiler>
+            # tree, which is the layout that pickle-bug-evolution.py and
+            # copy-stats.sh expect.
+            link = os.path.join(self.args.out, "Programs", run.oracle,
+                                run.compiler)
+            os.makedirs(os.path.dirname(link), exist_ok=True)
+            if os.path.lexists(link):
+                if os.path.islink(link) or not os.path.isdir(link):
+                    os.remove(link)
+                else:
+                    shutil.rmtree(link)
+            os.symlink(run.programs_dir, link)
+        self.manifest = discovery_log.Manifest(self.args.outdir)
+        self.log = discovery_log.DiscoveryLog(self.args.outdir)
+
+    def command(self, run):
+        ikaros = self.args.ikaros
+        if os.sep in ikaros:
+            # Runs do not start in the current directory.
+            ikaros = os.path.abspath(ikaros)
+        cmd = [ikaros, "--language", run.language,
+               "--pattern-gen", run.pattern_gen]
+        if self.args.iterations is not None:
+            cmd.extend(["--iterations", str(self.args.iterations)])
+        return cmd
+
+    def kill(self, run, sig):
+        with self.lock:
+            if run.pid is None or run.returncode is not None:
+                return
+            try:
+                # Each run is the leader of its own process group, so this
+                # also reaches the compilers and solvers it spawned.
+                os.killpg(run.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def timeout(self, run):
+        run.timed_out = True
+        self.terminate(run)
+
+    def terminate(self, run):
+        self.kill(run, signal.SIGTERM)
+        timer = threading.Timer(KILL_GRACE, self.kill,
+                                args=(run, signal.SIGKILL))
+        timer.daemon = True
+        timer.start()
+
+    def execute(self, run):
+        if self.cancelled.is_set():
+            run.status = "cancelled"
+            return run
+
+        log_path = os.path.join(run.cwd, "ikaros.log")
+        with self.lock:
+            run.start = time.monotonic()
+            self.log.start(run.name)
+            self.manifest.start(run.name, self.args.timeout)
+            try:
+                # The child keeps its own copy of the log file.
+                with open(log_path, "wb") as log:
+                    proc = subprocess.Popen(self.command(run), cwd=run.cwd,
+                                            stdout=log, stderr=log,
+                                            start_new_session=True)
+            except OSError as e:
+                # E.g., a missing Ikaros executable or run directory.
+                # Record the run as failed and go on with the others.
+                print(f"{run.name}: could not start Ikaros: {e}")
+                run.status = "failed"
+                run.wall_time = time.monotonic() - run.start
+                self.manifest.finish(run.name, run.status, run.wall_time)
+                return run
+            run.pid = proc.pid
+        run.status = "running"
+        deadline = threading.Timer(self.args.timeout, self.timeout,
+                                   args=(run,))
+        deadline.daemon = True
+        deadline.start()
+        # Reap the child ourselves to get its resource usage, which
+        # also covers the compilers it waited for.
+        _, status, usage = os.wait4(proc.pid, 0)
+        deadline.cancel()
+        run.wall_time = time.monotonic() - run.start
+
+        with self.lock:
+            run.returncode = proc.returncode = \
+                os.waitstatus_to_exitcode(status)
+        run.user_time = usage.ru_utime
+        run.system_time = usage.ru_stime
+        run.max_rss = usage.ru_maxrss
+        if self.cancelled.is_set():
+            run.status = "cancelled"
+        else:
+            run.status = "timeout" if run.timed_out else "finished"
+        with self.lock:
+            self.manifest.finish(run.name, run.status, run.wall_time)
+        if run.status == "cancelled":
+            return run
+
+        # The modification time of this file marks the end of the run
+        # (see extract_end_date in pickle-bug-evolution.py).
+        marker = os.path.join(self.args.outdir, run.name)
+        with open(marker, "a"):
+            os.utime(marker)
+        return run
+
+    def record(self, sources, events):
+        now = time.monotonic()
+        with self.lock:
+            for d, name, _ in events:
+                run, symptom = sources[d]
+                self.log.append(run.name, symptom, now - run.start, name)
+
+    def watch(self):
+        """Log every bug file as soon as a run creates it."""
+        sources = {
+            d: (run, symptom)
+            for run in self.runs
+            for symptom, d in run.bug_dirs().items()
+        }
+        dirs = {d: SUFFIXES[run.compiler] for d, (run, _) in sources.items()}
+        watcher = bug_watcher.create_watcher(dirs, interval=WATCH_INTERVAL)
+        try:
+            while not self.finished.is_set():
+                self.record(sources, watcher.poll(WATCH_INTERVAL))
+            # Catch the files created right before the runs terminated.
+            for d in dirs:
+                self.record(sources, watcher.scan(d))
+        finally:
+            watcher.close()
+
+    def sample(self):
+        """Record the resource usage of every running run."""
+        sampler = resource_sampler.Sampler()
+        writers = {}
+        try:
+            while not self.finished.wait(self.args.sample_interval):
+                with self.lock:
+                    # Every run is the leader of its own session.
+                    running = {
+                        run.pid: run for run in self.runs
+                        if run.pid is not None and run.returncode is None
+                    }
+                now = time.monotonic()
+                records = sampler.sample(
+                    {pid: run.start for pid, run in running.items()}, now)
+                for pid, record in records.items():
+                    run = running[pid]
+                    if run.name not in writers:
+                        writers[run.name] = resource_sampler.Writer(
+                            resource_sampler.get_path(self.args.outdir,
+                                                      run.name),
+                            self.manifest.data["runs"][run.name]["start"],
+                            self.args.sample_interval)
+                    writers[run.name].append(now - run.start, record)
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+    def cancel(self):
+        self.cancelled.set()
+        for run in self.runs:
+            self.terminate(run)
+
+    def start(self):
+        self.prepare()
+        threads = [threading.Thread(target=self.watch)]
+        if self.args.sample_interval > 0 and resource_sampler.available():
+            threads.append(threading.Thread(target=self.sample))
+        for thread in threads:
+            thread.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.args.jobs) as executor:
+                futures = [executor.submit(self.execute, run)
+                           for run in self.runs]
+                try:
+                    for future in futures:
+                        future.result()
+                except KeyboardInterrupt:
+                    self.cancel()
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            self.finished.set()
+            for thread in threads:
+                thread.join()
+            self.log.close()
+        return self.runs
+
+
+def save_accounting(runs, outdir):
+    file_path = os.path.join(outdir, "runs.csv")
+    with open(file_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["compiler", "oracle", "status", "returncode",
+                         "wall_time", "user_time", "system_time",
+                         "max_rss"])
+        for run in runs:
+            writer.writerow([run.compiler, run.pattern_gen, run.status,
+                             run.returncode, round(run.wall_time, 3),
+                             round(run.user_time, 3),
+                             round(run.system_time, 3), run.max_rss])
+
+
+def print_table(title, runs):
+    header = ("Run", "Status", "Wall (s)", "CPU (s)", "Max RSS (MB)")
+    row_format = "{:<20}" + "{:<12}" * (len(header) - 1)
+    lenght = 20 + 12 * (len(header) - 1)
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for run in runs:
+        row = (run.name, run.status, round(run.wall_time, 1),
+               round(run.user_time + run.system_time, 1),
+               round(run.max_rss / 1024, 1))
+        print(row_format.format(*row))
+
+
+def main():
+    args = get_args()
+    orchestrator = Orchestrator(args)
+
+    def on_signal(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, on_signal)
+    try:
+        runs = orchestrator.start()
+    except KeyboardInterrupt:
+        runs = orchestrator.runs
+    save_accounting(runs, args.outdir)
+    print_table("Ikaros runs", runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,19 +12,5 @@ if [ -z $2 ]; then
   exit 1
 fi
 
-outdir=$2
-mkdir -p $outdir
-rm -f $outdir/*
-rm -rf out
-
-timeout $1 ikaros --language scala --pattern-gen construction
-touch $2/scalac_construction
-
-timeout $1 ikaros --language scala --pattern-gen z3
-touch $2/scalac_z3
-
-timeout $1 ikaros --language java --pattern-gen z3
-touch $2/javac_z3
-
-timeout $1 ikaros --language java --pattern-gen construction
-touch $2/javac_construction
+# All runs are now orchestrated (concurrently) by run-ikaros.py.
+exec python "$(dirname "$0")/run-ikaros.py" "$@"
@@ -0,0 +1,21 @@
+"""Import the analysis scripts (whose file names are not valid module
+names) so that other scripts can reuse their functions."""
+import importlib.util
+import os
+import sys
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script(name):
+    """Load `<name>.py` from the scripts directory, e.g., `bug-evolution`."""
+    module_name = name.replace("-", "_")
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    path = os.path.join(SCRIPTS_DIR, f"{name}.py")
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,202 @@
+"""Mergeable summaries for computing statistics over streams of samples.
+
+* `RunningMoments` keeps the count, the mean and the sum of squared
+  deviations of a stream (exact; merged with Chan et al.'s formula).
+* `IntegerHistogram` counts the occurrences of every value of a stream of
+  small non-negative integers (exact; merged by adding the counts).
+* `KLLSketch` is a KLL quantile sketch (Karnin, Lang and Liberty, 2016).
+  It keeps O(k) samples regardless of the length of the stream, and every
+  quantile it reports is off by at most `rank_error()` in rank (with high
+  probability).
+
+Both summaries can be updated with whole NumPy arrays (e.g., one chunk of
+a .stats file at a time), and summaries built in different processes can
+be merged.
+"""
+import math
+
+import numpy as np
+
+
+class RunningMoments:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        other = RunningMoments()
+        other.count = len(values)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        self.merge(other)
+
+    def merge(self, other):
+        count = self.count + other.count
+        if count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+    def mean_error(self):
+        """Half-width of the 95% confidence interval of the mean."""
+        if self.count == 0:
+            return 0.0
+        return 1.96 * self.std() / math.sqrt(self.count)
+
+
+class IntegerHistogram:
+    def __init__(self):
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def n(self):
+        return int(self.counts.sum())
+
+    def update(self, values):
+        values = np.asarray(values)
+        if len(values) == 0:
+            return
+        if values.min() < 0:
+            raise ValueError("IntegerHistogram only counts non-negative"
+                             " integers")
+        self.add(np.bincount(values.astype(np.int64)))
+
+    def merge(self, other):
+        self.add(other.counts)
+
+    def add(self, counts):
+        total = np.zeros(max(len(self.counts), len(counts)), dtype=np.int64)
+        total[:len(self.counts)] += self.counts
+        total[:len(counts)] += counts
+        self.counts = total
+
+    def mean(self):
+        return float(np.dot(np.arange(len(self.counts)), self.counts) /
+                     self.n)
+
+    def percentile(self, q):
+        """Same as np.percentile (linear interpolation) over the samples."""
+        cumulative = np.cumsum(self.counts)
+        position = q / 100 * (cumulative[-1] - 1)
+        low, high = np.searchsorted(
+            cumulative, [math.floor(position), math.ceil(position)],
+            side="right")
+        return float(low + (position - math.floor(position)) * (high - low))
+
+    def weighted_samples(self):
+        """Return the distinct values along with their counts."""
+        values = np.flatnonzero(self.counts)
+        return values, self.counts[values]
+
+
+class KLLSketch:
+    # Ratio between the capacities of two consecutive levels.
+    DECAY = 2 / 3
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        # levels[h] holds samples of weight 2^h.
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * self.DECAY ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self.compress()
+
+    def merge(self, other):
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.compress()
+
+    def compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self.capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            # An odd item out stays at this level; every other item of the
+            # rest moves one level up with twice the weight.
+            keep = items[:len(items) % 2]
+            items = items[len(items) % 2:]
+            offset = self.rng.integers(2)
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate(
+                (self.levels[level + 1], items[offset::2]))
+            level += 1
+
+    def rank_error(self):
+        """Normalized rank error of the quantiles reported by the sketch.
+
+        The constants come from the empirical study of the DataSketches
+        library (99% confidence). No sample has been discarded as long as
+        the sketch consists of a single level, so the quantiles are exact.
+        """
+        if len(self.levels) == 1:
+            return 0.0
+        return 2.296 / self.k ** 0.9723
+
+    def quantile(self, q):
+        if self.n == 0:
+            return math.nan
+        if len(self.levels) == 1:
+            # No sample has been discarded, so interpolate between the
+            # two closest samples (same as np.quantile).
+            return float(np.quantile(self.levels[0], min(max(q, 0), 1)))
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        items, weights = self.weighted_samples()
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        index = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return float(items[order][min(index, len(items) - 1)])
+
+    def quantile_bounds(self, q):
+        """Values between which the exact q-quantile lies."""
+        eps = self.rank_error()
+        return self.quantile(q - eps), self.quantile(q + eps)
+
+    def weighted_samples(self):
+        """Return the retained samples along with their weights."""
+        weights = np.concatenate([
+            np.full(len(items), 2 ** level, dtype=np.int64)
+            for level, items in enumerate(self.levels)
+        ])
+        return np.concatenate(self.levels), weights
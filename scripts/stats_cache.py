@@ -0,0 +1,260 @@
+"""Binary columnar cache for the .stats files produced by Ikaros.
+
+The first time a .stats file is loaded, every column of the file is parsed
+and stored as a .npy file under a `.stats-cache/` directory that lives next
+to the .stats file. Subsequent loads memory-map these .npy files, so they
+take no parsing and no copying. Each cache entry records the size and the
+modification time of the .stats file it was built from and it is rebuilt
+when either of them changes.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+CACHE_DIR = ".stats-cache"
+CACHE_VERSION = 2
+
+
+def compact(values):
+    """Cast integers to the smallest integer dtype that holds them.
+
+    Any other array is returned as is.
+    """
+    if values.dtype.kind not in "iu":
+        return values
+    if len(values) == 0:
+        return values.astype(np.uint8)
+    dtype = np.result_type(np.min_scalar_type(values.min()),
+                           np.min_scalar_type(values.max()))
+    return values.astype(dtype)
+
+
+def get_cache_dir(file_path):
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)),
+                        CACHE_DIR, os.path.basename(file_path))
+
+
+def get_source_info(file_path):
+    stat = os.stat(file_path)
+    return {
+        "version": CACHE_VERSION,
+        "source": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_valid(file_path, meta):
+    if meta is None:
+        return False
+    info = get_source_info(file_path)
+    return all(meta.get(k) == v for k, v in info.items())
+
+
+def scan(file_path, chunksize):
+    """Find the type and the range of every column of a .stats file.
+
+    Return the number of rows and a dict that maps every column to a
+    (kind, min, max) triple, where kind is "b" (booleans), "i"
+    (integers), "f" (floats) or "O" (anything else, stored as codes).
+    """
+    import pandas as pd
+
+    rows = 0
+    columns = {}
+    for chunk in pd.read_csv(file_path, chunksize=chunksize):
+        rows += len(chunk)
+        for column in chunk.columns:
+            values = chunk[column]
+            kind = values.dtype.kind
+            kind = "i" if kind == "u" else kind
+            if kind not in "bif":
+                kind = "O"
+            lo = hi = None
+            if kind in "if" and values.notna().any():
+                lo, hi = values.min(), values.max()
+            if column not in columns:
+                columns[column] = (kind, lo, hi)
+                continue
+            prev_kind, prev_lo, prev_hi = columns[column]
+            if kind != prev_kind:
+                # Integers that are missing in some chunk become floats;
+                # any other mix is stored as codes.
+                kind = ("f" if {kind, prev_kind} == {"i", "f"}
+                        else "O")
+            if prev_lo is not None:
+                lo = prev_lo if lo is None else min(lo, prev_lo)
+                hi = prev_hi if hi is None else max(hi, prev_hi)
+            columns[column] = (kind, lo, hi)
+    return rows, columns
+
+
+def get_dtype(kind, lo, hi):
+    if kind == "b":
+        return np.dtype(bool)
+    if kind == "f":
+        return np.dtype(np.float64)
+    if lo is None:
+        return np.dtype(np.uint8)
+    return np.result_type(np.min_scalar_type(lo), np.min_scalar_type(hi))
+
+
+def build(file_path, chunksize=100000):
+    """Parse a .stats file and store each of its columns in the cache.
+
+    The file is parsed twice, one chunk at a time: once to find the type
+    of every column, and once to fill the memory-mapped .npy files, so
+    the memory footprint does not depend on the size of the file.
+    """
+    import pandas as pd
+
+    info = get_source_info(file_path)
+    rows, kinds = scan(file_path, chunksize)
+    cache_dir = get_cache_dir(file_path)
+    parent = os.path.dirname(cache_dir)
+    os.makedirs(parent, exist_ok=True)
+
+    # Build the entry in a temporary directory and move it in place at the
+    # end, so that concurrent readers never see a partial entry.
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    columns = {}
+    arrays = {}
+    categories = {}
+    for i, (column, (kind, lo, hi)) in enumerate(kinds.items()):
+        entry = {"file": f"{i}.npy"}
+        if kind == "O":
+            # Codes are stored as int32 first and compacted at the end,
+            # since the number of categories is not known yet.
+            dtype = np.dtype(np.int32)
+            categories[column] = {}
+        else:
+            dtype = get_dtype(kind, lo, hi)
+        arrays[column] = np.lib.format.open_memmap(
+            os.path.join(tmp_dir, entry["file"]), mode="w+", dtype=dtype,
+            shape=(rows,))
+        columns[column] = entry
+
+    dtype = {column: str for column in categories}
+    start = 0
+    for chunk in pd.read_csv(file_path, chunksize=chunksize, dtype=dtype):
+        end = start + len(chunk)
+        for column, values in chunk.items():
+            if column in categories:
+                # Translate the codes of the chunk to the codes of the
+                # file; missing values keep the code -1 (see load_column).
+                codes = categories[column]
+                chunk_codes, chunk_categories = pd.factorize(values)
+                mapping = np.array(
+                    [codes.setdefault(c, len(codes))
+                     for c in chunk_categories] + [-1], dtype=np.int32)
+                arrays[column][start:end] = mapping[chunk_codes]
+            else:
+                arrays[column][start:end] = values.to_numpy()
+        start = end
+
+    for column, codes in categories.items():
+        entry = columns[column]
+        path = os.path.join(tmp_dir, entry["file"])
+        dtype = np.result_type(np.int8, np.min_scalar_type(len(codes)))
+        compacted = np.lib.format.open_memmap(f"{path}.tmp", mode="w+",
+                                              dtype=dtype, shape=(rows,))
+        for start in range(0, rows, chunksize):
+            compacted[start:start + chunksize] = \
+                arrays[column][start:start + chunksize]
+        del compacted
+        arrays[column] = None
+        os.replace(f"{path}.tmp", path)
+        entry["categories"] = list(codes)
+    arrays.clear()
+
+    meta = dict(info, rows=rows, columns=columns)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    try:
+        os.rename(tmp_dir, cache_dir)
+    except OSError:
+        # Another process has just built the same entry.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return meta
+
+
+def load_column(cache_dir, meta, column):
+    entry = meta["columns"][column]
+    path = os.path.join(cache_dir, entry["file"])
+    # Empty arrays cannot be memory-mapped.
+    values = np.load(path, mmap_mode="r" if meta["rows"] else None)
+    if "categories" in entry:
+        # The code -1 of missing values picks the trailing NaN.
+        categories = np.asarray(entry["categories"] + [np.nan], dtype=object)
+        values = categories[values]
+    return values
+
+
+def load_columns(file_path, columns, nrows=None, dtype=None,
+                 use_cache=True):
+    """Load the given columns of a .stats file as NumPy arrays.
+
+    At most `nrows` rows are returned (all rows when `nrows` is None). When
+    `use_cache` is true the arrays are read-only views on the memory-mapped
+    cache; otherwise the file is parsed directly (only the requested
+    columns, with the given `dtype`) and the cache is not touched.
+    """
+    if not use_cache:
+        import pandas as pd
+        df = pd.read_csv(file_path, usecols=list(columns), dtype=dtype,
+                         nrows=nrows)
+        return {column: compact(df[column].to_numpy()) for column in columns}
+
+    cache_dir = get_cache_dir(file_path)
+    meta = read_meta(cache_dir)
+    if not is_valid(file_path, meta):
+        meta = build(file_path)
+    missing = [column for column in columns if column not in meta["columns"]]
+    if missing:
+        raise ValueError(
+            f"{file_path}: missing column(s) {', '.join(missing)}")
+    return {
+        column: load_column(cache_dir, meta, column)[:nrows]
+        for column in columns
+    }
+
+
+def iter_chunks(file_path, columns, nrows=None, chunksize=100000,
+                dtype=None, use_cache=True):
+    """Yield the given columns of a .stats file in chunks of rows.
+
+    Every chunk is a dict that maps each column to a NumPy array of at most
+    `chunksize` rows. Without the cache, the file is parsed chunk by chunk.
+    """
+    if use_cache:
+        data = load_columns(file_path, columns, nrows=nrows)
+        length = len(data[columns[0]])
+        for start in range(0, length, chunksize):
+            yield {column: values[start:start + chunksize]
+                   for column, values in data.items()}
+        return
+
+    import pandas as pd
+    chunks = pd.read_csv(file_path, usecols=list(columns), dtype=dtype,
+                         nrows=nrows, chunksize=chunksize)
+    for chunk in chunks:
+        yield {column: chunk[column].to_numpy() for column in columns}
+
+
+def clear(data_dir):
+    """Remove the cache of all .stats files in the given directory."""
+    shutil.rmtree(os.path.join(data_dir, CACHE_DIR), ignore_errors=True)
@@ -1,25 +1,72 @@
 import argparse
-import csv
+from concurrent.futures import ProcessPoolExecutor
+import functools
 import os
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-
-plt.style.use('default')
-sns.set(style="whitegrid")
-plt.rcParams['font.monospace'] = 'Inconsolata Medium'
-plt.rcParams['font.size'] = 19
-plt.rcParams['axes.labelsize'] = 22
-plt.rcParams['axes.titlesize'] = 14
-plt.rcParams['xtick.labelsize'] = 19
-plt.rcParams['ytick.labelsize'] = 18
-plt.rcParams['legend.fontsize'] = 22
-plt.rcParams['figure.titlesize'] = 24
-plt.rcParams['figure.figsize'] = (9, 5)
-plt.rcParams['pdf.fonttype'] = 42
+import build_cache
+import plotting
+import sketches
+import stats_cache
+
+
+# Columns of a .stats file that describe the generated programs, along with
+# the type used to parse them.
+STATS_COLUMNS = {
+    "num_types": np.int64,
+    "num_constructors": np.int64,
+    "num_gadts": np.int64,
+    "num_constructor_params": np.float64,
+    "num_generics": np.int64,
+    "num_patterns": np.int64,
+}
+
+# Rows of Table 2b.
+TABLE_2B = [
+    {
+        "column": "num_types",
+        "use_log": False,
+        "figname": "types.pdf",
+        "description": "Type declarations",
+    },
+    {
+        "column": "num_constructors",
+        "use_log": False,
+        "figname": "constructors.pdf",
+        "description": "Constructors"
+    },
+    {
+        "column": "num_gadts",
+        "use_log": False,
+        "figname": "gadts.pdf",
+        "description": "GADTs"
+    },
+    {
+        "column": "num_constructor_params",
+        "use_log": False,
+        "figname": "params.pdf",
+        "description": "Constructor params",
+    },
+    {
+        "column": "num_generics",
+        "use_log": False,
+        "figname": "generics.pdf",
+        "description": "Polymorphic types",
+    },
+    {
+        "column": "num_patterns",
+        "use_log": True,
+        "figname": "patterns.pdf",
+        "description": "Patterns",
+    },
+]
+
+# Upper bounds (inclusive) of the buckets of Figure 8; the last bucket has
+# no upper bound.
+PATTERN_EDGES = [5, 10, 20, 50, 100]
+
+PATTERN_METHODS = ["RPG", "RefPG"]
 
 
 def get_args():
@@ -32,41 +79,139 @@ def get_args():
                         action="store_true",
                         help=("Generate figure that shows the frequency "
                               "of patterns"))
-    return parser.parse_args()
-
-
-def load_data(data_dir):
-    data = {}
-    stat = 'num_patterns'
+    parser.add_argument("--pattern-edges", type=int, nargs="+",
+                        default=PATTERN_EDGES,
+                        help=("Upper bounds of the buckets of the figure"
+                              " generated with --patterns"))
+    parser.add_argument("--no-cache",
+                        default=False,
+                        action="store_true",
+                        help="Parse the .stats files without using the cache")
+    parser.add_argument("--clear-cache",
+                        default=False,
+                        action="store_true",
+                        help="Remove the cache of the .stats files first")
+    parser.add_argument("--no-plot",
+                        default=False,
+                        action="store_true",
+                        help=("Only print tables; do not generate any"
+                              " figure. With --patterns, print the data"
+                              " of the figure instead."))
+    parser.add_argument("--streaming",
+                        default=False,
+                        action="store_true",
+                        help=("Compute Table 2b in a single chunked pass"
+                              " over each .stats file using quantile"
+                              " sketches (bounded memory). Approximate"
+                              " values are followed by their error bounds."))
+    parser.add_argument("--chunk-size", type=int, default=100000,
+                        help="Number of rows per chunk in streaming mode")
+    parser.add_argument("--sketch-size", type=int, default=200,
+                        help=("Size (k) of the quantile sketches; larger"
+                              " sketches are more accurate"))
+    parser.add_argument("--jobs", type=int,
+                        help=("Number of processes used to render the"
+                              " histograms (default: number of CPUs)"))
+    parser.add_argument("--build-cache",
+                        help=("Directory of a store of figures; figures are"
+                              " copied from the store when they are"
+                              " up to date (see build_cache.py)."))
+    args = parser.parse_args()
+    edges = args.pattern_edges
+    if edges[0] < 1 or any(a >= b for a, b in zip(edges, edges[1:])):
+        parser.error("--pattern-edges must be positive and increasing")
+    return args
+
+
+def stats_files(data_dir):
     for file in os.listdir(data_dir):
         if not file.endswith(".stats"):
             continue
         segs = file.split(".stats")
         compiler, oracle = tuple(segs[0].split("_"))
         oracle = oracle.capitalize()
-        file_path = os.path.join(data_dir, file)
-        df = pd.read_csv(file_path)[:10000]
-        if oracle not in data:
-            data[oracle] = df[stat]
-        else:
-            data[oracle] = pd.concat([data[oracle], df[stat]],
-                                     ignore_index=True)
-    return pd.DataFrame(data=data)
+        yield compiler, oracle, os.path.join(data_dir, file)
 
 
-def plot_pattern_diagram(df, output_dir):
-    fig, ax = plt.subplots()
+def load_data(data_dir, use_cache=True):
+    """Parse every .stats file of the given directory once.
 
+    The result maps each (compiler, oracle) pair to a dict that holds one
+    compact NumPy array per column of STATS_COLUMNS.
+    """
+    data = {}
+    for compiler, oracle, file_path in stats_files(data_dir):
+        columns = stats_cache.load_columns(file_path, STATS_COLUMNS,
+                                           dtype=STATS_COLUMNS,
+                                           use_cache=use_cache)
+        params = columns["num_constructor_params"]
+        columns["num_constructor_params"] = \
+            stats_cache.compact(np.rint(params).astype(np.int64))
+        data[(compiler, oracle)] = columns
+    return data
+
+
+def get_pattern_data(data):
+    """Return the number of patterns of the first 10,000 programs of every
+    .stats file, grouped by pattern generation method."""
     method_mapping = {"Z3": "RPG", "Construction": "RefPG"}
-    bins = [0, 5, 10, 20, 50, 100, float('inf')]
-    labels = ["[1, 5]", "[6, 10]", "[11, 20]", "[21, 50]", "[51, 100]", "> 100"]
+    patterns = {}
+    for (compiler, oracle), columns in data.items():
+        patterns.setdefault(method_mapping[oracle], []).append(
+            columns["num_patterns"][:10000])
+    return {method: np.concatenate(samples)
+            for method, samples in patterns.items()}
+
+
+def get_pattern_labels(edges=PATTERN_EDGES):
+    bounds = [0] + list(edges)
+    return [f"[{lo + 1}, {hi}]" for lo, hi in zip(bounds, bounds[1:])] + \
+        [f"> {bounds[-1]}"]
+
+
+def count_patterns(patterns, edges=PATTERN_EDGES):
+    """Count the programs of every method that fall in each bucket.
+
+    Programs with no patterns are not counted. Return a dict that maps
+    every method to an array with one count per bucket.
+    """
+    bounds = np.asarray([0] + list(edges))
+    counts = {}
+    for method in PATTERN_METHODS:
+        values = patterns.get(method, np.empty(0, dtype=np.int64))
+        # Bucket i holds the values in (bounds[i - 1], bounds[i]].
+        buckets = np.searchsorted(bounds, values, side="left")
+        counts[method] = np.bincount(buckets,
+                                     minlength=len(bounds) + 1)[1:]
+    return counts
+
+
+def plot_pattern_diagram(patterns, output_dir, edges=PATTERN_EDGES,
+                         cache=None):
+    counts = count_patterns(patterns, edges)
+    if cache is None:
+        cache = build_cache.BuildCache()
+    cache.build("patterns.pdf", os.path.join(output_dir, "patterns.pdf"),
+                lambda: render_pattern_diagram(counts, output_dir, edges),
+                data={"counts": counts, "edges": edges},
+                sources=[__file__, plotting.__file__])
+
+
+def render_pattern_diagram(counts, output_dir, edges):
+    import pandas as pd
+
+    plt, sns = plotting.setup()
+    fig, ax = plt.subplots()
 
-    df_melted = df.melt(var_name="Method", value_name="Patterns")
-    df_melted["Method"] = df_melted["Method"].map(method_mapping)
-    df_melted["Category"] = pd.cut(df_melted["Patterns"], bins=bins, labels=labels, right=True)
-    category_counts = df_melted.groupby(["Method", "Category"], observed=True).size().reset_index(name="Count")
+    labels = get_pattern_labels(edges)
+    category_counts = pd.DataFrame([
+        {"Method": method, "Category": label, "Count": count}
+        for method, method_counts in counts.items()
+        for label, count in zip(labels, method_counts)
+    ])
 
-    sns.barplot(data=category_counts, x="Category", y="Count", hue="Method", palette="gray")
+    sns.barplot(data=category_counts, x="Category", y="Count", hue="Method",
+                order=labels, hue_order=PATTERN_METHODS, palette="gray")
 
     plt.legend()
     plt.xlabel("Number of cases")
@@ -77,100 +222,156 @@ def plot_pattern_diagram(df, output_dir):
                 pad_inches=0)
 
 
-def get_stats_data(data_dir):
-    data_types = []
-    data_constructors = []
-    data_gadts = []
-    data_params = []
-    data_generics = []
-    data_cases = []
-    for file in os.listdir(data_dir):
-        if not file.endswith(".stats"):
-            continue
-        segs = file.split(".stats")
-        compiler, oracle = tuple(segs[0].split("_"))
-        oracle = oracle.capitalize()
-        file_path = os.path.join(data_dir, file)
-        with open(file_path, newline='', encoding='utf-8') as csvfile:
-            csv_reader = csv.reader(csvfile)
-            next(csv_reader)
-            for row in csv_reader:
-                nu_types = int(row[0])
-                nu_constructors = int(row[1])
-                nu_gadts = int(row[3])
-                nu_params = int(round(float(row[4])))
-                nu_generics = int(row[5])
-                nu_patterns = int(row[7])
-                data_types.append(nu_types)
-                data_constructors.append(nu_constructors)
-                data_gadts.append(nu_gadts)
-                data_params.append(nu_params)
-                data_generics.append(nu_generics)
-                data_cases.append(nu_patterns)
+def print_pattern_table(title, patterns, edges=PATTERN_EDGES):
+    counts = count_patterns(patterns, edges)
+    header = ("Pat Gen",) + tuple(get_pattern_labels(edges))
+    row_format = "{:<10}" * len(header)
+    lenght = 10 * len(header)
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for method in PATTERN_METHODS:
+        row = [method] + list(counts[method])
+        print(row_format.format(*row))
+
+
+def get_stats_data(data):
+    def samples(column):
+        return np.concatenate([columns[column] for columns in data.values()])
+
     return [
-        {
-            "samples": data_types,
-            "use_log": False,
-            "figname": "types.pdf",
-            "description": "Type declarations",
-        },
-        {
-            "samples": data_constructors,
-            "use_log": False,
-            "figname": "constructors.pdf",
-            "description": "Constructors"
-        },
-        {
-            "samples": data_gadts,
-            "use_log": False,
-            "figname": "gadts.pdf",
-            "description": "GADTs"
-        },
-        {
-            "samples": data_params,
-            "use_log": False,
-            "figname": "params.pdf",
-            "description": "Constructor params",
-        },
-        {
-            "samples": data_generics,
-            "use_log": False,
-            "figname": "generics.pdf",
-            "description": "Polymorphic types",
-        },
-        {
-            "samples": data_cases,
-            "use_log": True,
-            "figname": "patterns.pdf",
-            "description": "Patterns",
-        },
+        dict(row, samples=samples(row["column"]))
+        for row in TABLE_2B
     ]
 
 
-def generate_histogram(samples, use_log, histogram_filename):
-    """Generate histogram and save it as a PDF without white space."""
-    plt.figure(figsize=(4, 1))  # Fixed height (1 inch)
+def summarize_file(file_path, chunksize=100000, use_cache=True, k=200,
+                   seed=None):
+    """Summarize every column of a .stats file in a single chunked pass.
+
+    Each column is summarized by a KLL sketch (quantiles) and its running
+    moments (mean and variance), so the memory footprint does not depend
+    on the size of the file.
+    """
+    summary = {
+        column: (sketches.KLLSketch(k, seed), sketches.RunningMoments())
+        for column in STATS_COLUMNS
+    }
+    chunks = stats_cache.iter_chunks(file_path, list(STATS_COLUMNS),
+                                     chunksize=chunksize, dtype=STATS_COLUMNS,
+                                     use_cache=use_cache)
+    for chunk in chunks:
+        for column, values in chunk.items():
+            if column == "num_constructor_params":
+                values = np.rint(values)
+            sketch, moments = summary[column]
+            sketch.update(values)
+            moments.update(values)
+    return summary
+
+
+def load_summaries(data_dir, chunksize=100000, use_cache=True, k=200,
+                   jobs=None):
+    """Summarize the .stats files in parallel and merge the summaries."""
+    summaries = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(summarize_file, file_path, chunksize, use_cache,
+                            k, seed)
+            for seed, (_, _, file_path) in enumerate(stats_files(data_dir))
+        ]
+        for future in futures:
+            for column, (sketch, moments) in future.result().items():
+                if column not in summaries:
+                    summaries[column] = sketch, moments
+                    continue
+                summaries[column][0].merge(sketch)
+                summaries[column][1].merge(moments)
+    return summaries
+
+
+def get_sketch_data(summaries):
+    return [
+        dict(row, sketch=summaries[row["column"]][0],
+             moments=summaries[row["column"]][1])
+        for row in TABLE_2B
+    ]
 
-    nu_bins = len(set(samples))
+
+def get_histogram_data(histograms):
+    return [
+        dict(row, histogram=histograms[row["column"]])
+        for row in TABLE_2B
+    ]
+
+
+def describe(data):
+    """Compute the statistics of a row of Table 2b."""
+    if "histogram" in data:
+        histogram = data["histogram"]
+        return (histogram.percentile(5), round(histogram.mean()),
+                histogram.percentile(50), histogram.percentile(95))
+    if "samples" in data:
+        samples = data["samples"]
+        percentile_5 = np.percentile(samples, 5)
+        mean = round(np.mean(samples))
+        median = np.median(samples)
+        percentile_95 = np.percentile(samples, 95)
+        return percentile_5, mean, median, percentile_95
+
+    # Approximate statistics: every quantile is followed by the range in
+    # which the exact quantile lies, and the mean by its 95% CI.
+    sketch, moments = data["sketch"], data["moments"]
+
+    def quantile(q):
+        low, high = sketch.quantile_bounds(q)
+        return f"{sketch.quantile(q)} [{low:g}, {high:g}]"
+
+    mean = f"{round(moments.mean)} ±{moments.mean_error():.2g}"
+    return quantile(0.05), mean, quantile(0.5), quantile(0.95)
+
+
+def get_histogram(data):
+    if "samples" in data:
+        return compute_histogram(data["samples"], data["use_log"])
+    summary = data["histogram"] if "histogram" in data else data["sketch"]
+    samples, weights = summary.weighted_samples()
+    return compute_histogram(samples, data["use_log"], weights)
+
+
+def compute_histogram(samples, use_log, weights=None):
+    """Compute the bins, the counts and the limits of a histogram."""
+    samples = np.asarray(samples, dtype=np.float64)
     if use_log:
-        new_samples = []
-        for s in samples:
-            if s < 1:
-                new_samples.append(s + 1)
-            else:
-                new_samples.append(s)
-        samples = new_samples
-        plt.xscale('log')
-        bins = np.logspace(np.log10(min(samples)), np.log10(max(samples)), 20)
+        samples = np.where(samples < 1, samples + 1, samples)
+        bins = np.logspace(np.log10(samples.min()),
+                           np.log10(samples.max()), 20)
     else:
-        if nu_bins > 12:
-            nu_bins = 12
-        bins = np.linspace(min(samples), max(samples), nu_bins + 1)
+        nu_bins = min(len(np.unique(samples)), 12)
+        bins = np.linspace(samples.min(), samples.max(), nu_bins + 1)
+    counts, bins = np.histogram(samples, bins=bins, weights=weights)
+    return {
+        "bins": bins,
+        "counts": counts,
+        "use_log": use_log,
+        "xlim": (samples.min(), samples.max()),
+        "ylim": (0, counts.max()),
+    }
+
+
+def render_histogram(histogram, histogram_filename):
+    """Render a precomputed histogram as a PDF without white space."""
+    plt, _ = plotting.setup()
+    plt.figure(figsize=(4, 1))  # Fixed height (1 inch)
 
-    # Create histogram
-    # bins = optimal_bins(samples)
+    bins, counts = histogram["bins"], histogram["counts"]
+    if histogram["use_log"]:
+        plt.xscale('log')
 
-    plt.hist(samples, bins=bins, color='red', edgecolor='white', linewidth=0.8)
+    # Every bin is drawn from a single sample weighted by its count.
+    plt.hist(bins[:-1], bins=bins, weights=counts, color='red',
+             edgecolor='white', linewidth=0.8)
 
     # Remove all axis labels and ticks
     plt.xticks([])  # Remove xticks
@@ -183,8 +384,8 @@ def generate_histogram(samples, use_log, histogram_filename):
     plt.gca().tick_params(axis='x', which='both', bottom=False, top=False)  # Hides all x ticks
     plt.gca().tick_params(axis='y', which='both', left=False, right=False)  # Hides all y ticks
     # Set the limits to be tight around the bars, no padding
-    plt.xlim(min(samples), max(samples))  # Limit x-axis to the range of the samples
-    plt.ylim(0, np.max(np.histogram(samples, bins=bins)[0]))  # Limit y-axis to the maximum frequency
+    plt.xlim(*histogram["xlim"])  # Limit x-axis to the range of the samples
+    plt.ylim(*histogram["ylim"])  # Limit y-axis to the maximum frequency
 
     # Use tight_layout to remove extra space around the plot
     plt.tight_layout(pad=0)  # Ensure no padding around the plot
@@ -192,56 +393,101 @@ def generate_histogram(samples, use_log, histogram_filename):
     # Save histogram as PDF with tight bounding box to remove white space around it
     plt.savefig(histogram_filename, dpi=300, bbox_inches='tight', transparent=True)
     plt.close()
+    return histogram_filename
 
 
-def print_statistics_table(title, sample_data, output_dir):
+def init_worker():
+    plotting.setup()
+
+
+def print_statistics_table(title, sample_data, output_dir, jobs=None,
+                           plot=True, width=10, cache=None):
 
     def print_line(columns, values):
-        row_format = "{:<20}" + "{:<10}" * (len(columns) - 2) + "{:<30}"
+        row_format = "{:<20}" + f"{{:<{width}}}" * (len(columns) - 2) + \
+            "{:<30}"
         print(row_format.format(*values))
 
     header = ("Description", "5%", "Mean", "Median", "95%", "Histogram")
-    row_format = "{:<20}" + "{:<10}" * (len(header) - 2) + "{:<30}"
-    lenght = 10 * (len(header) - 2) + 50
+    row_format = "{:<20}" + f"{{:<{width}}}" * (len(header) - 2) + "{:<30}"
+    lenght = width * (len(header) - 2) + 50
     print(title.center(lenght))
     print(lenght * "=")
     print(row_format.format(*header))
     print(lenght * "-")
 
-    for i, data in enumerate(sample_data):
-        samples, figname, use_log, description = data["samples"], \
-            data["figname"], data["use_log"], data['description']
-
-        # Calculate statistics
-        percentile_5 = np.percentile(samples, 5)
-        mean = round(np.mean(samples))
-        median = np.median(samples)
-        percentile_95 = np.percentile(samples, 95)
-
-        # Generate histogram file name
-        histogram_filename = figname
+    executor = None
+    if plot:
         histogram_dir = f"{output_dir}/histograms"
 
         # Ensure the directory exists to save the histograms
         if not os.path.exists(histogram_dir):
             os.makedirs(histogram_dir)
-
-        # Generate histogram and save it in the 'histograms' directory
-        histogram_path = os.path.join(histogram_dir, histogram_filename)
-        generate_histogram(samples, use_log, histogram_path)
-
-        row = description, percentile_5, mean, median, percentile_95, histogram_path
-        print_line(header, row)
+        executor = ProcessPoolExecutor(max_workers=jobs,
+                                       initializer=init_worker)
+
+    if cache is None:
+        cache = build_cache.BuildCache()
+    rows = []
+    histogram_path = None
+    try:
+        for i, data in enumerate(sample_data):
+            figname, description = data["figname"], data['description']
+
+            # Calculate statistics
+            row = (description,) + describe(data)
+
+            # Render the histogram in the 'histograms' directory, while the
+            # statistics of the remaining rows are computed.
+            future = None
+            if executor is not None:
+                histogram_path = os.path.join(histogram_dir, figname)
+                histogram = get_histogram(data)
+                future = cache.submit(
+                    executor, f"histograms/{figname}", histogram_path,
+                    functools.partial(render_histogram, histogram,
+                                      histogram_path),
+                    data=histogram, sources=[__file__, plotting.__file__])
+
+            rows.append((row, future, histogram_path))
+
+        for row, future, histogram_path in rows:
+            if future is not None:
+                future.result()
+            else:
+                histogram_path = "-"
+            print_line(header, row + (histogram_path,))
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
 
 def main():
     args = get_args()
+    if args.clear_cache:
+        stats_cache.clear(args.data)
+    if not args.streaming or args.patterns:
+        data = load_data(args.data, use_cache=not args.no_cache)
     if args.patterns:
-        df = load_data(args.data)
-        plot_pattern_diagram(df, args.output)
+        patterns = get_pattern_data(data)
+        if args.no_plot:
+            print_pattern_table("Figure 8", patterns, args.pattern_edges)
+        else:
+            plot_pattern_diagram(patterns, args.output, args.pattern_edges,
+                                 build_cache.BuildCache(args.build_cache))
+    elif args.streaming:
+        summaries = load_summaries(args.data, args.chunk_size,
+                                   not args.no_cache, args.sketch_size,
+                                   args.jobs)
+        stats = get_sketch_data(summaries)
+        print_statistics_table("Table 2b", stats, args.output, args.jobs,
+                               plot=not args.no_plot, width=18,
+                               cache=build_cache.BuildCache(args.build_cache))
     else:
-        stats = get_stats_data(args.data)
-        print_statistics_table("Table 2b", stats, args.output)
+        stats = get_stats_data(data)
+        print_statistics_table("Table 2b", stats, args.output, args.jobs,
+                               plot=not args.no_plot,
+                               cache=build_cache.BuildCache(args.build_cache))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,267 @@
+import argparse
+import math
+
+import numpy as np
+
+from script_loader import load_script
+import stats_cache
+
+
+performance = load_script("study-performance")
+
+# Columns of a .stats file that describe the shape of the generated
+# programs, along with their names in the tables.
+SHAPE_COLUMNS = {
+    "num_types": "Types",
+    "num_constructors": "Constructors",
+    "num_gadts": "GADTs",
+    "num_generics": "Generics",
+    "num_patterns": "Patterns",
+    "max_pattern_depth": "Depth",
+}
+
+# Columns of a .stats file with timings (in μs); the timings of the SMT
+# solver are only recorded by the runs that use Z3.
+TIME_COLUMNS = {
+    "processing_time": "Compilation",
+    "solver_time": "SMT solving",
+    "enumeration_time": "Enumeration",
+}
+
+PERCENTILES = [50, 95, 99]
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description=("Relate the characteristics of the generated programs"
+                     " to their compilation and SMT solving times"))
+    parser.add_argument("data",
+                        help="Directory with statistics")
+    parser.add_argument("--bins", type=int, default=3,
+                        help=("Number of buckets of every characteristic"
+                              " in the tail latency table (split at"
+                              " quantiles)"))
+    parser.add_argument("--top", type=int, default=10,
+                        help="Number of shape buckets in the tail table")
+    parser.add_argument("--min-programs", type=int, default=30,
+                        help=("Shape buckets with fewer programs are left"
+                              " out of the tail latency table"))
+    parser.add_argument("--rows", type=int, default=0,
+                        help=("Number of programs to consider from each"
+                              " .stats file (0 considers all programs)"))
+    parser.add_argument("--no-cache",
+                        default=False,
+                        action="store_true",
+                        help="Parse the .stats files without using the cache")
+    args = parser.parse_args()
+    if args.bins < 1:
+        parser.error("--bins must be positive")
+    return args
+
+
+def get_time_columns(oracle):
+    if oracle == "z3":
+        return list(TIME_COLUMNS)
+    return ["processing_time"]
+
+
+def load_stats(file_path, oracle, nrows, use_cache):
+    columns = list(SHAPE_COLUMNS) + get_time_columns(oracle)
+    return stats_cache.load_columns(
+        file_path, columns, nrows=nrows,
+        dtype={c: np.int64 for c in columns}, use_cache=use_cache)
+
+
+def standardize(shape):
+    """Return the characteristics that vary, and their z-scores (one
+    column per characteristic)."""
+    names = [name for name, values in shape.items()
+             if len(values) and values.min() < values.max()]
+    z = np.empty((len(next(iter(shape.values()))), len(names)))
+    for i, name in enumerate(names):
+        values = np.asarray(shape[name], dtype=np.float64)
+        z[:, i] = (values - values.mean()) / values.std()
+    return names, z
+
+
+def fit_cost_model(names, z, times):
+    """Fit log(1 + time) to the standardized characteristics.
+
+    Return the R² of the fit and, for every characteristic, the factor
+    by which the time grows when the characteristic grows by one standard
+    deviation (the others being equal), and the R² of the characteristic
+    on its own (its squared correlation with the time). The
+    characteristics are correlated (e.g., types and constructors), so the
+    R² of the fit is not the sum of the latter. Characteristics that do
+    not vary are left out.
+    """
+    y = np.log1p(times)
+    y -= y.mean()
+    sst = np.dot(y, y)
+    if not names or sst == 0:
+        return math.nan, {}, {}
+    # The normal equations only take a pass over the rows.
+    zy = z.T @ y
+    beta = np.linalg.lstsq(z.T @ z, zy, rcond=None)[0]
+    r2 = 1 - np.sum((y - z @ beta) ** 2) / sst
+    # Every column of z has unit variance, so zy / n is the covariance
+    # of every characteristic with the time.
+    corr = zy / len(y) / math.sqrt(sst / len(y))
+    factors = dict(zip(names, np.exp(beta)))
+    alone = dict(zip(names, corr ** 2))
+    return r2, factors, alone
+
+
+def bucket_indexes(values, bins):
+    """Split values at their quantiles into (at most) `bins` buckets."""
+    edges = np.unique(np.quantile(values, np.arange(1, bins) / bins))
+    return np.searchsorted(edges, values, side="left"), len(edges) + 1
+
+
+def shape_buckets(shape, bins):
+    """Put every program in the bucket of each of its characteristics.
+
+    Return the bucket of every program (a number), and the range of every
+    characteristic within each (non-empty) bucket, in the order of the
+    buckets.
+    """
+    indexes, dims = zip(*(bucket_indexes(values, bins)
+                          for values in shape.values()))
+    buckets = np.ravel_multi_index(indexes, dims)
+    order = np.argsort(buckets, kind="stable")
+    sorted_buckets = buckets[order]
+    starts = np.flatnonzero(
+        np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    ranges = {
+        name: (np.minimum.reduceat(values[order], starts),
+               np.maximum.reduceat(values[order], starts))
+        for name, values in shape.items()
+    }
+    return buckets, ranges
+
+
+def group_percentiles(sorted_values, starts, counts, q):
+    """Same as np.percentile (linear interpolation) within every group of
+    a sorted array."""
+    position = starts + q / 100 * (counts - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    return sorted_values[low] + (position - low) * (
+        sorted_values[high] - sorted_values[low])
+
+
+def tail_buckets(buckets, ranges, times, min_programs):
+    """Compute the tail latency of every shape bucket (see shape_buckets).
+
+    Return one dict per bucket with at least `min_programs` programs,
+    slowest first (by 99th percentile). Every dict holds the range of
+    every characteristic in the bucket, the number of programs, the
+    percentiles of the time, and the share of the total time spent on
+    the programs of the bucket.
+    """
+    # Sort the times by bucket and then by time with a single sort of
+    # integer keys (times are in μs and stay far below 2^40).
+    keys = np.sort((buckets.astype(np.int64) << 40) |
+                   np.asarray(times, dtype=np.int64))
+    sorted_buckets = keys >> 40
+    sorted_times = (keys & ((1 << 40) - 1)).astype(np.float64)
+    starts = np.flatnonzero(
+        np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    percentiles = {
+        q: group_percentiles(sorted_times, starts, counts, q)
+        for q in PERCENTILES
+    }
+    total = sorted_times.sum()
+    share = (100 * np.add.reduceat(sorted_times, starts) / total
+             if total > 0 else np.zeros(len(starts)))
+    keep = np.flatnonzero(counts >= min_programs)
+    slowest = keep[np.argsort(-percentiles[PERCENTILES[-1]][keep],
+                              kind="stable")]
+    return [
+        {
+            "ranges": {name: (low[i], high[i])
+                       for name, (low, high) in ranges.items()},
+            "programs": int(counts[i]),
+            "percentiles": {q: values[i]
+                            for q, values in percentiles.items()},
+            "share": share[i],
+        }
+        for i in slowest
+    ]
+
+
+def format_value(val, digits=2):
+    if math.isnan(val):
+        return "-"
+    return str(round(val, digits))
+
+
+def to_ms(val):
+    return str(round(val / 1000, 1)) + "ms"
+
+
+def print_model_table(title, r2, factors, alone):
+    header = ("Characteristic", "× per std dev", "R² alone")
+    row_format = "{:<20}" * len(header)
+    lenght = 20 * len(header)
+    print(f"{title} (R² = {format_value(r2)})".center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for column, name in SHAPE_COLUMNS.items():
+        print(row_format.format(
+            name, format_value(factors.get(column, math.nan)),
+            format_value(alone.get(column, math.nan))))
+
+
+def print_tail_table(title, buckets, top):
+    header = tuple(SHAPE_COLUMNS.values()) + ("Programs",) + tuple(
+        f"p{q}" for q in PERCENTILES) + ("Time %",)
+    row_format = "{:<13}" * len(header)
+    lenght = 13 * len(header)
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for bucket in buckets[:top]:
+        ranges = tuple(
+            str(int(low)) if low == high else f"{int(low)}-{int(high)}"
+            for low, high in (bucket["ranges"][column]
+                              for column in SHAPE_COLUMNS))
+        row = ranges + (bucket["programs"],) + tuple(
+            to_ms(val) for val in bucket["percentiles"].values()) + (
+                format_value(bucket["share"], 1),)
+        print(row_format.format(*row))
+
+
+def main():
+    args = get_args()
+    nrows = args.rows or None
+    first = True
+    for compiler, oracle, file_path in sorted(
+            performance.stats_files(args.data)):
+        stats = load_stats(file_path, oracle, nrows, not args.no_cache)
+        if not len(stats["num_types"]):
+            continue
+        shape = {column: stats[column] for column in SHAPE_COLUMNS}
+        names, z = standardize(shape)
+        buckets, ranges = shape_buckets(shape, args.bins)
+        run = f"{compiler}_{oracle}"
+        for column in get_time_columns(oracle):
+            times = stats[column]
+            name = TIME_COLUMNS[column]
+            if not first:
+                print()
+            first = False
+            print_model_table(f"{name} time of {run}",
+                              *fit_cost_model(names, z, times))
+            print()
+            print_tail_table(
+                f"Slowest shape buckets: {name.lower()} time of {run}",
+                tail_buckets(buckets, ranges, times, args.min_programs),
+                args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,36 @@
 import argparse
-import csv
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import math
 import os
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
+import bootstrap
+import sketches
+import stats_cache
 
-plt.style.use('default')
-sns.set(style="whitegrid")
-plt.rcParams['font.monospace'] = 'Inconsolata Medium'
-plt.rcParams['font.size'] = 19
-plt.rcParams['axes.labelsize'] = 22
-plt.rcParams['axes.titlesize'] = 14
-plt.rcParams['xtick.labelsize'] = 19
-plt.rcParams['ytick.labelsize'] = 18
-plt.rcParams['legend.fontsize'] = 22
-plt.rcParams['figure.titlesize'] = 24
-plt.rcParams['figure.figsize'] = (9, 5)
-plt.rcParams['pdf.fonttype'] = 42
+
+DATA_KEYS = [
+    "scalac_construction",
+    "scalac_z3",
+    "javac_construction",
+    "javac_z3",
+    "ghc_construction",
+    "ghc_z3",
+]
+
+# SMT runs that took longer than this (in μs) are considered as timeouts.
+SMT_TIMEOUT = 50000
+
+# Columns of a .stats file and the metric stored in each of them.
+METRICS = {
+    "processing_time": "compilation",
+    "program_gen_time": "generation",
+    "solver_time": "SMT solving",
+}
+
+COMPILERS = ["javac", "scalac", "ghc"]
 
 
 def get_args():
@@ -27,44 +38,236 @@ def get_args():
         description='Study the performance of the generated programs')
     parser.add_argument("data",
                         help="Directory with statistics")
-    return parser.parse_args()
+    parser.add_argument("--rows", type=int,
+                        help=("Number of programs to consider from each"
+                              " .stats file (0 considers all programs);"
+                              " by default, all programs with --streaming"
+                              " or --error-bounds and 10000 otherwise"))
+    parser.add_argument("--streaming",
+                        default=False,
+                        action="store_true",
+                        help=("Compute the means in a single chunked pass"
+                              " over each .stats file (constant memory),"
+                              " processing the files in parallel"))
+    parser.add_argument("--chunk-size", type=int, default=100000,
+                        help="Number of rows per chunk in streaming mode")
+    parser.add_argument("--error-bounds",
+                        default=False,
+                        action="store_true",
+                        help=("Report the 95%% confidence interval of each"
+                              " mean (implies --streaming)"))
+    parser.add_argument("--jobs", type=int,
+                        help=("Number of processes used in streaming mode"
+                              " (default: number of CPUs)"))
+    parser.add_argument("--no-cache",
+                        default=False,
+                        action="store_true",
+                        help="Parse the .stats files without using the cache")
+    parser.add_argument("--smt-timeout", type=int, default=SMT_TIMEOUT,
+                        help=("SMT runs that took at least this time (in μs)"
+                              " are considered as timeouts"))
+    parser.add_argument("--clear-cache",
+                        default=False,
+                        action="store_true",
+                        help="Remove the cache of the .stats files first")
+    parser.add_argument("--confidence-intervals",
+                        default=False,
+                        action="store_true",
+                        help=("Report bootstrap confidence intervals of the"
+                              " means and the medians, and the effect sizes"
+                              " of RPG over RefPG"))
+    parser.add_argument("--resamples", type=int, default=10000,
+                        help="Number of bootstrap resamples")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="Confidence level of the bootstrap intervals")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the bootstrap resamples")
+    args = parser.parse_args()
+    if args.rows is None:
+        args.rows = 0 if args.streaming or args.error_bounds else 10000
+    if args.confidence_intervals and (args.streaming or args.error_bounds):
+        parser.error("--confidence-intervals needs whole columns; it cannot"
+                     " be combined with --streaming or --error-bounds")
+    if not 0 < args.confidence < 1:
+        parser.error("--confidence must be between 0 and 1")
+    if args.resamples < 1:
+        parser.error("--resamples must be positive")
+    return args
 
 
-def load_data(data_dir):
-    data = {
-        "scalac_construction": {},
-        "scalac_z3": {},
-        "javac_construction": {},
-        "javac_z3": {},
-        "ghc_construction": {},
-        "ghc_z3": {},
-    }
+def get_columns(oracle):
+    columns = ["processing_time", "program_gen_time"]
+    if oracle == "z3":
+        columns.append("solver_time")
+    return columns
+
+
+def stats_files(data_dir):
     for file in os.listdir(data_dir):
         if not file.endswith(".stats"):
             continue
         segs = file.split(".stats")
         compiler, oracle = tuple(segs[0].split("_"))
         oracle = oracle.lower()
-        file_path = os.path.join(data_dir, file)
-        df = pd.read_csv(file_path)[:10000]
+        yield compiler, oracle, os.path.join(data_dir, file)
+
+
+def load_data(data_dir, nrows=10000, use_cache=True):
+    data = {key: {} for key in DATA_KEYS}
+    for compiler, oracle, file_path in stats_files(data_dir):
+        columns = get_columns(oracle)
+        values = stats_cache.load_columns(
+            file_path, columns, nrows=nrows,
+            dtype={c: np.int64 for c in columns}, use_cache=use_cache)
         key = f"{compiler}_{oracle}"
-        data[key]["compilation"] = df["processing_time"]
-        data[key]["generation"] = df["program_gen_time"]
-        if oracle == "z3":
-            data[key]["SMT solving"] = df["solver_time"]
+        for column, df in values.items():
+            data[key][METRICS[column]] = df
     return data
 
 
-def print_performance_table(title, data, unit):
+def compute_means(data, smt_timeout=SMT_TIMEOUT):
+    means = {}
+    for key, metrics in data.items():
+        means[key] = {metric: df.mean() for metric, df in metrics.items()}
+        if "SMT solving" in metrics:
+            df = metrics["SMT solving"]
+            means[key]["SMT solving (w/ timeout)"] = \
+                df[df < smt_timeout].mean()
+    return means
+
+
+def compute_intervals(data, smt_timeout=SMT_TIMEOUT, n_resamples=10000,
+                      confidence=0.95, jobs=None, seed=0):
+    """Compute bootstrap confidence intervals for every metric.
+
+    Return the intervals of the mean and the median of every metric of
+    every run, as (estimate, low, high) triples, and the differences
+    between the RPG and the RefPG runs of every compiler, along with their
+    effect sizes (Cohen's d and Cliff's delta).
+    """
+    columns = {}
+    for key, metrics in data.items():
+        for metric, df in metrics.items():
+            columns[key, metric] = df
+        if "SMT solving" in metrics:
+            df = metrics["SMT solving"]
+            columns[key, "SMT solving (w/ timeout)"] = df[df < smt_timeout]
+    resamples = bootstrap.bootstrap(columns, n_resamples, jobs, seed)
+
+    def interval(estimate, estimates):
+        return (estimate,) + bootstrap.percentile_interval(estimates,
+                                                           confidence)
+
+    intervals = {key: {} for key in data}
+    for (key, metric), r in resamples.items():
+        df = columns[key, metric]
+        intervals[key][metric] = {
+            "mean": interval(df.mean(), r["mean"]),
+            "median": interval(np.median(df), r["median"]),
+        }
+    differences = {compiler: {} for compiler in COMPILERS}
+    for compiler in COMPILERS:
+        for metric in ["generation", "compilation"]:
+            refpg = (f"{compiler}_construction", metric)
+            rpg = (f"{compiler}_z3", metric)
+            if refpg not in resamples or rpg not in resamples:
+                continue
+            a, b = columns[refpg], columns[rpg]
+            differences[compiler][metric] = {
+                "mean": interval(
+                    b.mean() - a.mean(),
+                    resamples[rpg]["mean"] - resamples[refpg]["mean"]),
+                "median": interval(
+                    np.median(b) - np.median(a),
+                    resamples[rpg]["median"] - resamples[refpg]["median"]),
+                "d": bootstrap.cohens_d(a, b),
+                "delta": bootstrap.cliffs_delta(a, b),
+            }
+    return intervals, differences
+
+
+def summarize_file(compiler, oracle, file_path, nrows=10000,
+                   chunksize=100000, use_cache=True,
+                   smt_timeout=SMT_TIMEOUT):
+    """Summarize every metric of a .stats file in a single chunked pass.
+
+    Only the running moments of each metric are kept in memory, so the
+    memory footprint does not depend on the size of the file.
+    """
+    columns = get_columns(oracle)
+    moments = defaultdict(sketches.RunningMoments)
+    chunks = stats_cache.iter_chunks(file_path, columns, nrows=nrows,
+                                     chunksize=chunksize,
+                                     dtype={c: np.int64 for c in columns},
+                                     use_cache=use_cache)
+    for chunk in chunks:
+        for column, values in chunk.items():
+            moments[METRICS[column]].update(values)
+            if column == "solver_time":
+                moments["SMT solving (w/ timeout)"].update(
+                    values[values < smt_timeout])
+    return f"{compiler}_{oracle}", dict(moments)
+
+
+def load_moments(data_dir, nrows=10000, chunksize=100000, use_cache=True,
+                 jobs=None, smt_timeout=SMT_TIMEOUT):
+    """Summarize the .stats files in parallel and merge the summaries."""
+    moments = {key: defaultdict(sketches.RunningMoments)
+               for key in DATA_KEYS}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(summarize_file, compiler, oracle, file_path,
+                            nrows, chunksize, use_cache, smt_timeout)
+            for compiler, oracle, file_path in stats_files(data_dir)
+        ]
+        for future in futures:
+            key, summary = future.result()
+            for metric, m in summary.items():
+                moments[key][metric].merge(m)
+    return moments
+
+
+def get_means(moments):
+    return {
+        key: {
+            metric: m.mean if m.count else float("nan")
+            for metric, m in metrics.items()
+        }
+        for key, metrics in moments.items()
+    }
+
+
+def get_errors(moments):
+    return {
+        key: {metric: m.mean_error() for metric, m in metrics.items()}
+        for key, metrics in moments.items()
+    }
+
+
+def convert_value(val, unit):
+    val = round(val)
+    if unit == "ms":
+        val = round(val / 1000, 1)
+    return val
+
+
+def convert_metric(val, unit):
+    return str(convert_value(val, unit)) + unit
+
+
+def print_performance_table(title, means, unit, errors=None):
 
     def print_line(columns, values):
         row_format = "{:<20}" * len(columns)
         print(row_format.format(*values))
 
-    def convert_metric(val):
-        if unit == "ms":
-            val = round(val / 1000, 1)
-        return str(val) + unit
+    def format_metric(key, metric):
+        if math.isnan(means[key].get(metric, math.nan)):
+            return "-"
+        val = convert_metric(means[key][metric], unit)
+        if errors is not None:
+            val += " ±" + convert_metric(errors[key][metric], unit)
+        return val
 
     if title != "SMT solving":
         header = ("", "RefPG", "RPG")
@@ -79,33 +282,128 @@ def print_performance_table(title, data, unit):
     print(row_format.format(*header))
     print(lenght * "-")
 
-    for compiler in ["javac", "scalac", "ghc"]:
+    for compiler in COMPILERS:
         if key != "SMT solving":
-            metric1 = convert_metric(
-                round(data[f"{compiler}_construction"][key].mean())
-            )
+            metric1 = format_metric(f"{compiler}_construction", key)
         else:
-            df = data[f"{compiler}_z3"][key]
-            filtered_df = df[df < 50000]
-            metric1 = convert_metric(
-                round(filtered_df.mean())
-            )
-
-        metric2 = convert_metric(
-            round(data[f"{compiler}_z3"][key].mean())
-        )
+            metric1 = format_metric(f"{compiler}_z3",
+                                    "SMT solving (w/ timeout)")
+
+        metric2 = format_metric(f"{compiler}_z3", key)
         row = (compiler, metric1, metric2)
         print_line(header, row)
 
 
-def main():
-    args = get_args()
-    data = load_data(args.data)
-    print_performance_table("generation", data, "μs")
+def print_tables(means, errors=None):
+    print_performance_table("generation", means, "μs", errors)
+    print()
+    print_performance_table("compilation", means, "ms", errors)
+    print()
+    print_performance_table("SMT solving", means, "ms", errors)
+
+
+def print_interval_table(title, intervals, differences, unit, confidence):
+
+    def format_interval(interval):
+        if interval is None:
+            return "-"
+        estimate, low, high = interval
+        return (f"{convert_metric(estimate, unit)}"
+                f" [{convert_value(low, unit)}, {convert_value(high, unit)}]")
+
+    def get_interval(key, metric, statistic):
+        return intervals[key].get(metric, {}).get(statistic)
+
+    if title != "SMT solving":
+        header = ("", "RefPG", "RPG", "RPG - RefPG")
+    else:
+        header = ("", "w/ timeout", "w/o timeout")
+    row_format = "{:<20}" + "{:<30}" * (len(header) - 1)
+    lenght = 20 + 30 * (len(header) - 1)
+    key = title
+    title = (f"{title.capitalize()} time (Table 3,"
+             f" {confidence:.0%} bootstrap CI)")
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+
+    for compiler in COMPILERS:
+        for statistic in ["mean", "median"]:
+            if key != "SMT solving":
+                row = (
+                    get_interval(f"{compiler}_construction", key, statistic),
+                    get_interval(f"{compiler}_z3", key, statistic),
+                    differences[compiler].get(key, {}).get(statistic),
+                )
+            else:
+                row = (
+                    get_interval(f"{compiler}_z3",
+                                 "SMT solving (w/ timeout)", statistic),
+                    get_interval(f"{compiler}_z3", key, statistic),
+                )
+            row = (f"{compiler} {statistic}",) + tuple(
+                format_interval(interval) for interval in row)
+            print(row_format.format(*row))
+
+
+def print_effect_size_table(differences):
+    metrics = ["generation", "compilation"]
+    header = ("",) + tuple(f"{metric.capitalize()} {name}"
+                           for metric in metrics for name in ["d", "δ"])
+    row_format = "{:<20}" * len(header)
+    lenght = 20 * len(header)
+    print("Effect size of RPG over RefPG (Table 3)".center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for compiler in COMPILERS:
+        row = (compiler,)
+        for metric in metrics:
+            diff = differences[compiler].get(metric)
+            if diff is None or math.isnan(diff["d"]):
+                row += ("-", "-")
+            else:
+                row += (round(diff["d"], 2), round(diff["delta"], 2))
+        print(row_format.format(*row))
+
+
+def print_interval_tables(intervals, differences, confidence):
+    print_interval_table("generation", intervals, differences, "μs",
+                         confidence)
     print()
-    print_performance_table("compilation", data, "ms")
+    print_interval_table("compilation", intervals, differences, "ms",
+                         confidence)
     print()
-    print_performance_table("SMT solving", data, "ms")
+    print_interval_table("SMT solving", intervals, differences, "ms",
+                         confidence)
+    print()
+    print_effect_size_table(differences)
+
+
+def main():
+    args = get_args()
+    if args.clear_cache:
+        stats_cache.clear(args.data)
+    nrows = args.rows or None
+    use_cache = not args.no_cache
+    errors = None
+    if args.confidence_intervals:
+        intervals, differences = compute_intervals(
+            load_data(args.data, nrows, use_cache), args.smt_timeout,
+            args.resamples, args.confidence, args.jobs, args.seed)
+        print_interval_tables(intervals, differences, args.confidence)
+        return
+    if args.streaming or args.error_bounds:
+        moments = load_moments(args.data, nrows, args.chunk_size, use_cache,
+                               args.jobs, args.smt_timeout)
+        means = get_means(moments)
+        if args.error_bounds:
+            errors = get_errors(moments)
+    else:
+        means = compute_means(load_data(args.data, nrows, use_cache),
+                              args.smt_timeout)
+    print_tables(means, errors)
 
 
 if __name__ == "__main__":
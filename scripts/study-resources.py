@@ -0,0 +1,177 @@
+import argparse
+import math
+import os
+
+import numpy as np
+
+import resource_sampler
+import stats_cache
+import timeline_store
+import timing
+
+
+RUNS = [
+    "javac_construction",
+    "javac_z3",
+    "scalac_construction",
+    "scalac_z3",
+    "ghc_construction",
+    "ghc_z3",
+]
+
+# Columns of a .stats file shown in the report (times in μs).
+STATS_COLUMNS = {
+    "processing_time": "Compile (ms)",
+    "solver_time": "SMT (ms)",
+}
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description=("Report the CPU and memory usage of Ikaros runs along"
+                     " with the timings of their programs and their bugs"))
+    parser.add_argument("time_dir",
+                        help=("Directory where run-ikaros.py stored the"
+                              " samples of every run (*.resources)"))
+    parser.add_argument("--stats",
+                        help=("Directory with the .stats file of every run"
+                              " (see copy-stats.sh)"))
+    parser.add_argument("--timelines",
+                        help=("Directory with the bug timelines of every run"
+                              " (see pickle-bug-evolution.py)"))
+    parser.add_argument("--window", type=float, default=3600,
+                        help="Length of every time window in seconds")
+    return parser.parse_args()
+
+
+def load_stats(stats_dir, run):
+    file_path = os.path.join(stats_dir, f"{run}.stats")
+    if not os.path.exists(file_path):
+        return None
+    columns = ["total_time"] + [c for c in STATS_COLUMNS
+                                if c != "solver_time" or
+                                run.endswith("_z3")]
+    return stats_cache.load_columns(file_path, columns,
+                                    dtype={c: np.int64 for c in columns})
+
+
+def window_means(offsets, values, window, n):
+    """Average the values that fall in each of the first n windows (NaN
+    for empty windows)."""
+    index = np.minimum((offsets // window).astype(np.int64), n - 1)
+    counts = np.bincount(index, minlength=n)
+    sums = np.bincount(index, weights=values, minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+def window_counts(offsets, window, n):
+    index = np.minimum((offsets // window).astype(np.int64), n - 1)
+    return np.bincount(index, minlength=n)
+
+
+def window_max(offsets, values, window, n):
+    index = np.minimum((offsets // window).astype(np.int64), n - 1)
+    peaks = np.full(n, np.nan)
+    np.fmax.at(peaks, index, values)
+    return peaks
+
+
+def summarize(samples, stats, bugs, window):
+    """Line up the samples, the programs and the bugs of a run per window.
+
+    Return a dict that maps every column of the report to an array with
+    one value per window.
+    """
+    ends = [samples["offset"][-1] if len(samples) else 0]
+    if stats is not None:
+        offsets = timing.program_offsets(stats["total_time"])
+        ends.append(offsets[-1] if len(offsets) else 0)
+    if bugs is not None and len(bugs):
+        ends.append(bugs.max())
+    n = max(1, math.ceil(max(ends) / window))
+    offsets_s = np.asarray(samples["offset"])
+    columns = {
+        "CPU %": window_means(offsets_s, samples["cpu"], window, n),
+        "RSS (MB)": window_max(offsets_s, samples["rss"], window, n),
+        "Procs": window_means(offsets_s, samples["processes"], window, n),
+    }
+    if stats is not None:
+        columns["Programs"] = window_counts(offsets, window, n)
+        for column, name in STATS_COLUMNS.items():
+            if column in stats:
+                columns[name] = window_means(
+                    offsets, stats[column] / 1000, window, n)
+    if bugs is not None:
+        columns["Bugs"] = window_counts(np.asarray(bugs), window, n)
+    return columns
+
+
+def format_value(val):
+    if isinstance(val, float) and math.isnan(val):
+        return "-"
+    if isinstance(val, float):
+        return str(round(val, 1))
+    return str(val)
+
+
+def print_usage_table(title, samples):
+    header = ("Run", "Samples", "CPU % (avg)", "CPU % (max)",
+              "Peak RSS (MB)") + tuple(
+                  f"{kind.upper()} procs" for kind in resource_sampler.KINDS)
+    row_format = "{:<20}" + "{:<15}" * (len(header) - 1)
+    lenght = 20 + 15 * (len(header) - 1)
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for run, s in samples.items():
+        if not len(s):
+            row = (run, 0) + ("-",) * (len(header) - 2)
+        else:
+            row = (run, len(s), format_value(float(s["cpu"].mean())),
+                   format_value(float(s["cpu"].max())),
+                   format_value(float(s["rss"].max()))) + tuple(
+                       int(s[f"{kind}_spawned"][-1])
+                       for kind in resource_sampler.KINDS)
+        print(row_format.format(*row))
+
+
+def print_window_table(title, columns, window):
+    header = ("From (h)",) + tuple(columns.keys())
+    row_format = "{:<15}" * len(header)
+    lenght = 15 * len(header)
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    n = len(next(iter(columns.values())))
+    for i in range(n):
+        row = (round(i * window / 3600, 2),) + tuple(
+            format_value(values[i].item()) for values in columns.values())
+        print(row_format.format(*row))
+
+
+def main():
+    args = get_args()
+    samples = {}
+    for run in RUNS:
+        file_path = resource_sampler.get_path(args.time_dir, run)
+        if os.path.exists(file_path):
+            samples[run] = resource_sampler.read(file_path)
+    print_usage_table("Resource usage", samples)
+    for run, s in samples.items():
+        compiler, oracle = run.split("_")
+        stats = None
+        if args.stats is not None:
+            stats = load_stats(args.stats, run)
+        bugs = None
+        if args.timelines is not None:
+            bugs = timeline_store.load(args.timelines, compiler, oracle)
+        print()
+        print_window_table(run, summarize(s, stats, bugs, args.window),
+                           args.window)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import argparse
+import math
+import sys
+
+import numpy as np
+
+from script_loader import load_script
+import stats_cache
+import timing
+
+
+performance = load_script("study-performance")
+evolution = load_script("bug-evolution")
+
+RESULTS = ["Sat", "Unsat", "Unknown"]
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description=("Study the throughput of Ikaros runs over time"))
+    parser.add_argument("data",
+                        help="Directory with statistics")
+    parser.add_argument("--evolution",
+                        help=("Directory with the bug timelines or pickles"
+                              " of the runs (or the SQLite index of"
+                              " index-bugs.py)"))
+    parser.add_argument("--campaign",
+                        help=("Campaign to consider when --evolution is an"
+                              " index with several campaigns"))
+    parser.add_argument("--window", type=float, default=3600,
+                        help="Length of every time window in seconds")
+    parser.add_argument("--step", type=float,
+                        help=("Seconds between the starts of two windows;"
+                              " a step shorter than the window gives"
+                              " rolling windows (default: the window)"))
+    parser.add_argument("--smt-timeout", type=int,
+                        default=performance.SMT_TIMEOUT,
+                        help=("SMT runs that take at least this time (in μs)"
+                              " are considered as timeouts"))
+    parser.add_argument("--rows", type=int, default=0,
+                        help=("Number of programs to consider from each"
+                              " .stats file (0 considers all programs)"))
+    parser.add_argument("--no-cache",
+                        default=False,
+                        action="store_true",
+                        help="Parse the .stats files without using the cache")
+    return parser.parse_args()
+
+
+def window_bounds(end, window, step):
+    """Return the start and the end of every window up to `end`."""
+    starts = np.arange(math.floor(end / step) + 1) * step
+    return starts, starts + window
+
+
+def window_sums(offsets, cumsums, starts, ends):
+    """Sum the values of the items that fall in every window.
+
+    `offsets` must be sorted and `cumsums` maps every name to the running
+    sum of a value (with a leading zero). Every window is a half-open
+    interval [start, end) and takes two lookups, whatever its length.
+    """
+    lo = np.searchsorted(offsets, starts, side="left")
+    hi = np.searchsorted(offsets, ends, side="left")
+    return {name: cs[hi] - cs[lo] for name, cs in cumsums.items()}
+
+
+def running_sum(values):
+    cs = np.empty(len(values) + 1, dtype=np.int64)
+    cs[0] = 0
+    np.cumsum(values, out=cs[1:])
+    return cs
+
+
+def compute_throughput(stats, bugs, window, step, smt_timeout):
+    """Compute the throughput of a run in every window.
+
+    Return the starts of the windows and a dict that maps every column of
+    the report to an array with one value per window.
+    """
+    offsets = timing.program_offsets(stats["total_time"])
+    cumsums = {"Programs": running_sum(np.ones(len(offsets), np.int8))}
+    if "result" in stats:
+        result = stats["result"]
+        for name in RESULTS:
+            cumsums[name] = running_sum(result == name)
+        cumsums["Timeout"] = running_sum(stats["solver_time"] >= smt_timeout)
+    end = offsets[-1] if len(offsets) else 0
+    if bugs is not None and len(bugs):
+        bugs = np.sort(np.asarray(bugs, dtype=np.float64))
+        end = max(end, bugs[-1])
+    starts, ends = window_bounds(end, window, step)
+    sums = window_sums(offsets, cumsums, starts, ends)
+
+    # The last windows may extend past the end of the run, so the rates
+    # are computed over the part of every window that the run covers.
+    lengths = np.minimum(ends, end) - starts
+    programs = sums.pop("Programs")
+    columns = {"Programs": programs}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        columns["Prog/s"] = np.where(lengths > 0, programs / lengths,
+                                     np.nan)
+        for name, values in sums.items():
+            columns[f"{name} %"] = 100 * values / programs
+        if bugs is not None:
+            counts = window_sums(bugs, {"Bugs": np.arange(len(bugs) + 1)},
+                                 starts, ends)["Bugs"]
+            columns["Bugs/h"] = np.where(lengths > 0,
+                                         counts * 3600 / lengths, np.nan)
+    return starts, columns
+
+
+def load_stats(file_path, oracle, nrows, use_cache):
+    columns = ["total_time"]
+    if oracle == "z3":
+        columns.extend(["solver_time", "result"])
+    dtype = {"total_time": np.int64, "solver_time": np.int64}
+    return stats_cache.load_columns(
+        file_path, columns, nrows=nrows,
+        dtype={c: dtype.get(c, str) for c in columns}, use_cache=use_cache)
+
+
+def load_bugs(data, compiler, oracle):
+    runs = data.get(f"{compiler}_{oracle}")
+    if not runs:
+        return np.empty(0)
+    return np.concatenate([np.asarray(times, dtype=np.float64)
+                           for times in runs.values()])
+
+
+def format_value(val):
+    if isinstance(val, float):
+        return "-" if math.isnan(val) else str(round(val, 2))
+    return str(val)
+
+
+def print_throughput_table(title, starts, columns):
+    header = ("From (h)",) + tuple(columns.keys())
+    row_format = "{:<12}" * len(header)
+    lenght = 12 * len(header)
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for i, start in enumerate(starts):
+        row = (round(start / 3600, 2),) + tuple(
+            format_value(values[i].item()) for values in columns.values())
+        print(row_format.format(*row))
+
+
+def main():
+    args = get_args()
+    step = args.step or args.window
+    nrows = args.rows or None
+    bug_data = None
+    if args.evolution is not None:
+        try:
+            bug_data = evolution.load_data(args.evolution, args.campaign)
+        except ValueError as e:
+            sys.exit(f"error: {e} with --campaign")
+    first = True
+    for compiler, oracle, file_path in sorted(
+            performance.stats_files(args.data)):
+        stats = load_stats(file_path, oracle, nrows, not args.no_cache)
+        bugs = None
+        if bug_data is not None:
+            bugs = load_bugs(bug_data, compiler, oracle)
+        starts, columns = compute_throughput(stats, bugs, args.window, step,
+                                             args.smt_timeout)
+        if not first:
+            print()
+        first = False
+        print_throughput_table(f"{compiler}_{oracle}", starts, columns)
+
+
+if __name__ == "__main__":
+    main()
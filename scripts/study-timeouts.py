@@ -0,0 +1,166 @@
+import argparse
+import math
+import os
+
+import numpy as np
+
+import plotting
+from script_loader import load_script
+
+
+performance = load_script("study-performance")
+throughput = load_script("study-throughput")
+
+# Results of the SMT solver that are answers (the rest are Unknown).
+ANSWERS = ["Sat", "Unsat"]
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description=("Replay the SMT runs of the .stats files under"
+                     " different timeouts"))
+    parser.add_argument("data",
+                        help="Directory with statistics")
+    parser.add_argument("--timeouts", type=int, nargs="+",
+                        help=("Timeouts to simulate (in μs); by default,"
+                              " --steps timeouts evenly spaced on a log"
+                              " scale from --min-timeout up to the longest"
+                              " recorded SMT run"))
+    parser.add_argument("--steps", type=int, default=50,
+                        help="Number of timeouts to simulate")
+    parser.add_argument("--min-timeout", type=int, default=1000,
+                        help="Shortest timeout to simulate (in μs)")
+    parser.add_argument("--output",
+                        help=("Directory to store the curve of every run"
+                              " (timeouts-<compiler>.pdf)"))
+    parser.add_argument("--rows", type=int, default=0,
+                        help=("Number of programs to consider from each"
+                              " .stats file (0 considers all programs)"))
+    parser.add_argument("--no-cache",
+                        default=False,
+                        action="store_true",
+                        help="Parse the .stats files without using the cache")
+    args = parser.parse_args()
+    if args.steps < 1 or args.min_timeout < 1:
+        parser.error("--steps and --min-timeout must be positive")
+    return args
+
+
+def get_timeouts(solver_time, steps, min_timeout):
+    longest = max(int(solver_time.max()), min_timeout)
+    return np.unique(np.rint(np.geomspace(min_timeout, longest, steps)))
+
+
+def simulate(stats, timeouts):
+    """Replay a run under every timeout (in μs).
+
+    An SMT run that takes at least the timeout is stopped at the timeout,
+    which saves the rest of its time and turns its result into Unknown;
+    the rest of the program's time (e.g., compilation) stays the same.
+    After a single sort of the solver times, every timeout takes a binary
+    search and a few lookups in running sums.
+
+    Return a dict that maps every column of the report to an array with
+    one value per timeout.
+    """
+    order = np.argsort(stats["solver_time"], kind="stable")
+    solver_time = np.asarray(stats["solver_time"], dtype=np.int64)[order]
+    result = stats["result"][order]
+    n = len(solver_time)
+    timeouts = np.asarray(timeouts, dtype=np.int64)
+
+    # The runs from `first` onwards take at least the timeout.
+    first = np.searchsorted(solver_time, timeouts, side="left")
+    stopped = n - first
+    solver_sums = throughput.running_sum(solver_time)
+    saved = solver_sums[-1] - solver_sums[first] - stopped * timeouts
+    hours = (int(np.sum(stats["total_time"], dtype=np.int64)) - saved) / 3.6e9
+
+    columns = {
+        "Programs/h": n / hours,
+        "Timeouts %": 100 * stopped / n,
+    }
+    answers = np.zeros(len(timeouts), dtype=np.int64)
+    for name in ANSWERS:
+        sums = throughput.running_sum(result == name)
+        # Every answer of a stopped run is lost.
+        kept = sums[first]
+        answers += kept
+        with np.errstate(invalid="ignore", divide="ignore"):
+            columns[f"{name} lost %"] = 100 * (1 - kept / sums[-1])
+    columns["Answers/h"] = answers / hours
+    return columns
+
+
+def format_value(val):
+    if math.isnan(val):
+        return "-"
+    return str(round(val, 1))
+
+
+def print_timeout_table(title, timeouts, columns):
+    header = ("Timeout (ms)",) + tuple(columns.keys())
+    row_format = "{:<15}" * len(header)
+    lenght = 15 * len(header)
+    print(title.center(lenght))
+    print(lenght * "=")
+    print(row_format.format(*header))
+    print(lenght * "-")
+    for i, timeout in enumerate(timeouts):
+        row = (round(timeout / 1000, 1),) + tuple(
+            format_value(values[i].item()) for values in columns.values())
+        print(row_format.format(*row))
+
+
+def plot_timeout_curve(timeouts, columns, output_file):
+    plt, sns = plotting.setup()
+    fig, ax = plt.subplots()
+    color_palette = sns.color_palette("colorblind")
+    for i, name in enumerate(["Programs/h", "Answers/h"]):
+        ax.plot(np.asarray(timeouts) / 1000, columns[name], label=name,
+                linestyle='-', linewidth=3, color=color_palette[i])
+    ax.set_xscale("log")
+    ax.set_xlabel("SMT timeout (ms)")
+    ax.set_ylabel("Programs per hour")
+    ax.legend()
+    plt.tight_layout()
+    plt.savefig(output_file, bbox_inches='tight', pad_inches=0)
+    plt.close(fig)
+
+
+def main():
+    args = get_args()
+    nrows = args.rows or None
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+    first = True
+    for compiler, oracle, file_path in sorted(
+            performance.stats_files(args.data)):
+        if oracle != "z3":
+            continue
+        stats = throughput.load_stats(file_path, oracle, nrows,
+                                      not args.no_cache)
+        if not len(stats["solver_time"]):
+            continue
+        timeouts = args.timeouts
+        if timeouts is None:
+            timeouts = get_timeouts(stats["solver_time"], args.steps,
+                                    args.min_timeout)
+        timeouts = np.unique(timeouts)
+        columns = simulate(stats, timeouts)
+        best = timeouts[np.argmax(columns["Answers/h"])]
+        if not first:
+            print()
+        first = False
+        print_timeout_table(
+            f"{compiler}_{oracle} (most answers/h with"
+            f" {round(best / 1000, 1)}ms)",
+            timeouts, columns)
+        if args.output is not None:
+            plot_timeout_curve(
+                timeouts, columns,
+                os.path.join(args.output, f"timeouts-{compiler}.pdf"))
+
+
+if __name__ == "__main__":
+    main()
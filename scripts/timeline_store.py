@@ -0,0 +1,128 @@
+"""Append-only store for the times when an Ikaros run discovered bugs.
+
+Every (compiler, oracle, symptom) triple is stored in its own file,
+`<compiler>_<oracle>.<symptom>.timeline`, which consists of a 16-byte
+header followed by the discovery times, i.e., the offsets (in seconds)
+from the start of the run, as little-endian float64 values:
+
+    magic (4 bytes, b"IKTL") | version (uint16) | item size (uint16) |
+    origin (float64, the start of the run in seconds since the epoch)
+
+New times are appended at the end of the file and the number of times is
+derived from the size of the file, so the header never changes after the
+file is created. Files are read through memory maps.
+"""
+import math
+import os
+import struct
+
+import numpy as np
+
+
+MAGIC = b"IKTL"
+VERSION = 1
+HEADER = struct.Struct("<4sHHd")
+DTYPE = np.dtype("<f8")
+SUFFIX = ".timeline"
+
+SYMPTOMS = ["false_positive", "false_negative"]
+# The pickles of pickle-bug-evolution.py do not separate the symptoms.
+UNKNOWN_SYMPTOM = "unknown"
+
+ORACLES = {
+    "z3": "Z3",
+    "construction": "Construction",
+}
+
+
+def get_path(data_dir, compiler, oracle, symptom):
+    return os.path.join(data_dir,
+                        f"{compiler}_{oracle.lower()}.{symptom}{SUFFIX}")
+
+
+def read_origin(file_path):
+    """Return the origin stored in the header of a timeline file."""
+    with open(file_path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{file_path}: truncated header")
+    magic, version, itemsize, origin = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or itemsize != DTYPE.itemsize:
+        raise ValueError(f"{file_path}: not a timeline file")
+    return origin
+
+
+def write(file_path, times, origin=math.nan):
+    """Create (or replace) a timeline file with the given times."""
+    times = np.asarray(times, dtype=DTYPE)
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, DTYPE.itemsize, origin))
+        f.write(times.tobytes())
+    os.replace(tmp_path, file_path)
+
+
+def append(file_path, times):
+    times = np.asarray(times, dtype=DTYPE)
+    read_origin(file_path)
+    with open(file_path, "ab") as f:
+        f.write(times.tobytes())
+
+
+def count(file_path):
+    # A time that was only partially written (e.g., the writer was killed)
+    # is ignored.
+    return (os.path.getsize(file_path) - HEADER.size) // DTYPE.itemsize
+
+
+def matches(file_path, origin, n):
+    """Check whether a timeline file exists, starts at `origin` and holds
+    exactly `n` times (and nothing else)."""
+    try:
+        size = os.path.getsize(file_path) - HEADER.size
+        return read_origin(file_path) == origin and \
+            size == n * DTYPE.itemsize
+    except (OSError, ValueError):
+        return False
+
+
+def read(file_path):
+    """Return the times of a timeline file as a read-only array."""
+    read_origin(file_path)
+    n = count(file_path)
+    if n == 0:
+        # Empty arrays cannot be memory-mapped.
+        return np.empty(0, dtype=DTYPE)
+    return np.memmap(file_path, dtype=DTYPE, mode="r", offset=HEADER.size,
+                     shape=(n,))
+
+
+def has_symptoms(data_dir, compiler, oracle):
+    """Check whether a (compiler, oracle) pair has per-symptom timelines."""
+    return any(
+        os.path.exists(get_path(data_dir, compiler, oracle, symptom))
+        for symptom in SYMPTOMS)
+
+
+def load(data_dir, compiler, oracle):
+    """Return the times of all symptoms of a (compiler, oracle) pair.
+
+    The timeline of the unknown symptom (converted from a pickle) is only
+    read when there are no per-symptom timelines, which hold the same
+    bugs once the run has been processed again. Return None if there is
+    no timeline file for this pair.
+    """
+    symptoms = SYMPTOMS
+    if not has_symptoms(data_dir, compiler, oracle):
+        symptoms = [UNKNOWN_SYMPTOM]
+    timelines = [
+        read(file_path)
+        for symptom in symptoms
+        for file_path in [get_path(data_dir, compiler, oracle, symptom)]
+        if os.path.exists(file_path)
+    ]
+    if not timelines:
+        return None
+    if len(timelines) == 1:
+        return timelines[0]
+    return np.concatenate(timelines)
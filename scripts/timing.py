@@ -0,0 +1,12 @@
+"""Timing of the programs of an Ikaros run, shared by the study scripts."""
+import numpy as np
+
+
+def program_offsets(total_time):
+    """Estimate when every program of a run was processed.
+
+    The .stats files do not record timestamps, so every program is assumed
+    to finish once the total times (in μs) of all the programs up to it
+    have elapsed. Return the offsets in seconds.
+    """
+    return np.cumsum(total_time, dtype=np.float64) / 1e6